@@ -0,0 +1,151 @@
+"""
+bulkStub.py - load _bulk files into a stub ElasticSearch and time it
+
+Usage:
+    python bench/bulkStub.py [-f FILES] [-d DOCS] [-c CONNS] [-b BUSY] [-z]
+
+This starts a stand-in for ElasticSearch's _bulk endpoint on a free local
+port and loads _bulk files into it with loadBulk, as --upload does. The
+stub turns away a share of the items (429) and the odd whole request
+(503), so the retries get exercised, and counts the connections it was
+asked to open. Without -f, synthetic _bulk files are written to a
+temporary folder, gzip'd with -z as --terms packed writes them. Every
+document should arrive exactly once.
+"""
+
+import argparse, glob, gzip, json, os, random, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import odw
+
+""" stub _bulk handler, stored documents and connection count are on the server """
+class bulk_handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, as ElasticSearch does
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conns += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.wire += len(body)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        index = self.path.rsplit('/',2)[1]
+        lines = body.splitlines()
+
+        with self.server.lock:
+            self.server.requests += 1
+            busy_request = self.server.rand.random() < self.server.busy / 4
+        if busy_request:
+            self.reply(503,{ "error" : "unavailable" })
+            return
+
+        items = []
+        with self.server.lock:
+            for cnt in range(0,len(lines) - 1,2):
+                doc_id = json.loads(lines[cnt])["index"]["_id"]
+                if self.server.rand.random() < self.server.busy:
+                    status = 429
+                else:
+                    status = 201
+                    self.server.docs[index].append(doc_id)
+                items.append({ "index" : { "_index" : index, "_id" : doc_id,
+                    "status" : status } })
+        self.reply(200,{ "took" : 1, "errors" : any(item["index"]["status"] != 201
+            for item in items), "items" : items })
+
+    def reply(self,status,obj):
+        data = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self,format,*args):
+        pass
+
+""" synthetic _bulk files for both indexes, about the size a page makes """
+def makeBulkFiles(tmp_dir,num_docs,cap,gz):
+    bwriter = odw.bulk_writer(tmp_dir + "/SYNTH",cap,gz)
+    rand = random.Random(1)
+    for cnt in range(num_docs):
+        doc_id = "SYNTH_1875-01-01-%04d" % cnt
+        page_file = tmp_dir + "/%04d.ndjson" % cnt
+        with open(page_file,"w") as outfile:
+            outfile.write(json.dumps({ "index" : { "_id" : doc_id } }) + "\n" +
+                json.dumps({ "pid" : doc_id, "full_text" : "word " * 8000 }) + "\n")
+        terms_file = tmp_dir + "/%04d_terms.ndjson" % cnt
+        with open(terms_file,"w") as outfile:
+            outfile.write(json.dumps({ "index" : { "_id" : doc_id } }) + "\n" +
+                json.dumps({ "issueident" : doc_id, "terms" : [{ "word" : "word",
+                "x0" : rand.randint(0,6000), "y0" : rand.randint(0,9000),
+                "x1" : 0, "y1" : 0, "conf" : 90, "fm" : 1 }
+                for term in range(8000)] }) + "\n")
+        odw.addBulkLines(bwriter,[[odw.PAGE_INDEX,page_file],[odw.TERMS_INDEX,terms_file]])
+    odw.closeBulkWriter(bwriter)
+    return bwriter.bulk_files
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-f","--files", type=str, default=None,
+    help="glob for existing _bulk files, e.g. 'results/build/AECHO_*.ndjson'")
+parser.add_argument("-d","--docs", default=500, type=int,
+    help="number of synthetic pages when no files are given")
+parser.add_argument("-c","--conns", default=4, type=int,
+    help="number of keep-alive connections for loading")
+parser.add_argument("-b","--busy", default=0.05, type=float,
+    help="share of items the stub turns away with 429")
+parser.add_argument("-z","--gzip", action="store_true", default=False,
+    help="gzip the synthetic _bulk files, so they are sent compressed")
+args = parser.parse_args()
+
+server = ThreadingHTTPServer(("127.0.0.1",0),bulk_handler)
+server.lock = threading.Lock()
+server.rand = random.Random(2)
+server.busy = args.busy
+server.conns = 0
+server.requests = 0
+server.wire = 0 # request bytes as sent
+server.docs = { odw.PAGE_INDEX.rsplit('/',1)[1] : [], odw.TERMS_INDEX.rsplit('/',1)[1] : [] }
+threading.Thread(target=server.serve_forever,daemon=True).start()
+stub_url = "http://127.0.0.1:%d" % server.server_address[1]
+
+tmp_dir = tempfile.TemporaryDirectory()
+if args.files is None:
+    bulk_files = makeBulkFiles(tmp_dir.name,args.docs,10 * 1024 * 1024,args.gzip)
+else:
+    bulk_files = []
+    for bulk_file in sorted(glob.glob(args.files)):
+        index = odw.TERMS_INDEX if "_" + odw.TERMS_INDEX.rsplit('/',1)[1] + "_" in \
+            bulk_file else odw.PAGE_INDEX
+        bulk_files.append((index,bulk_file))
+bulk_files = [(stub_url + "/" + index.rsplit('/',1)[1],bulk_file)
+    for index, bulk_file in bulk_files]
+
+sent = 0
+for index, bulk_file in bulk_files:
+    with (gzip.open if bulk_file.endswith(".gz") else open)(bulk_file,"rb") as f:
+        sent += len(f.read().splitlines()) // 2
+mb = sum(os.path.getsize(bulk_file) for index, bulk_file in bulk_files) / (1024 * 1024)
+
+odw.consts.BULK_RETRY = 0.01 # the stub is not really busy
+start = time.perf_counter()
+loaded, failed = odw.loadBulk(bulk_files,args.conns)
+load_time = time.perf_counter() - start
+server.shutdown()
+
+stored = [doc_id for docs in server.docs.values() for doc_id in docs]
+print("%d _bulk file(s), %.1f MB, %d document(s)" % (len(bulk_files),mb,sent))
+print("loaded %d, failed %d in %.2fs (%.1f MB/s)" % (loaded,failed,load_time,
+    mb / load_time))
+print("%d request(s) over %d connection(s), %.1f MB sent" % (server.requests,server.conns,
+    server.wire / (1024 * 1024)))
+for index, docs in server.docs.items():
+    print("%-14s %d stored, %d distinct" % (index,len(docs),len(set(docs))))
+if loaded != sent or len(stored) != sent or failed != 0:
+    print("MISMATCH")
+    sys.exit(1)
@@ -0,0 +1,191 @@
+"""
+makeIssues.py - write a synthetic newspaper collection for benchmarks
+
+Usage:
+    python bench/makeIssues.py [-o FOLDER] [-t TITLE] [-i ISSUES] [-p PAGES]
+        [-w WORDS] [-a PARS] [-b BLOCKS] [-c CONF] [-e EXT] [-s SIZE]
+
+Issues are laid out as TITLE/YYYY-MM-DD/YYYY-MM-DD-NNNN.hocr with a
+matching page image, as odwHocrBlockIiif.py expects. Each page has
+columns of blocks, paragraphs, lines and words in tesseract's HOCR
+markup, with word confidences spread around -c. The page image has
+dark strokes where the words are, so block crops and tiles are not
+blank.
+"""
+
+import argparse, os, random
+from datetime import datetime, timedelta
+from PIL import Image, ImageDraw
+
+MARGIN = 150 # page margin in pixels
+GUTTER = 60 # space between columns
+LINE_H = 42 # line pitch at 300 dpi or so
+WORDS = ["the","and","of","to","in","Echo","Amherstburg","Windsor","council",
+    "street","Mr.","Mrs.","river","sale","lot","week","Detroit","farm","church",
+    "1875","$2.50","No.","Essex","steamer","harbour","school","meeting","a&b"]
+
+""" word boxes for a page, columns of blocks of paragraphs of lines """
+def layoutPage(width,height,num_words,num_pars,num_blocks,rand):
+    num_pars = max(1,min(num_pars,num_words))
+    num_blocks = max(1,min(num_blocks,num_pars))
+    num_cols = min(6,num_blocks)
+    col_w = (width - 2 * MARGIN - (num_cols - 1) * GUTTER) // num_cols
+
+    #words are shared out to paragraphs, paragraphs to blocks, blocks to columns
+    par_words = [num_words // num_pars + (1 if cnt < num_words % num_pars else 0)
+        for cnt in range(num_pars)]
+    block_pars = [[] for cnt in range(num_blocks)]
+    for cnt, pwords in enumerate(par_words):
+        block_pars[cnt * num_blocks // num_pars].append(pwords)
+
+    words_per_line = max(1,col_w // 110)
+    col_blocks = [block_pars[cnt::num_cols] for cnt in range(num_cols)]
+    col_lines = [sum(-(-pwords // words_per_line) + 1 for pars in blocks for pwords in pars)
+        for blocks in col_blocks]
+    line_h = min(LINE_H,(height - 2 * MARGIN) // max(1,max(col_lines)))
+
+    blocks = []
+    for col, cblocks in enumerate(col_blocks):
+        x = MARGIN + col * (col_w + GUTTER)
+        y = MARGIN
+        for bpars in cblocks:
+            pars = []
+            for pwords in bpars:
+                lines = []
+                for start in range(0,pwords,words_per_line):
+                    line = []
+                    wx = x + (40 if start == 0 else 0)
+                    for cnt in range(min(words_per_line,pwords - start)):
+                        wtext = rand.choice(WORDS)
+                        ww = min(20 + 14 * len(wtext) + rand.randint(0,10),x + col_w - wx)
+                        wh = max(4,line_h * 2 // 3 - rand.randint(0,4))
+                        line.append((wtext,wx,y,wx + max(ww,4),y + wh))
+                        wx += ww + 14
+                    lines.append(line)
+                    y += line_h
+                pars.append(lines)
+                y += line_h
+            blocks.append(pars)
+    return blocks
+
+""" bbox over a list of word boxes """
+def boxOf(boxes):
+    return (min(box[1] for box in boxes),min(box[2] for box in boxes),
+        max(box[3] for box in boxes),max(box[4] for box in boxes))
+
+""" HOCR for the page, as tesseract writes it """
+def writeHocr(hocr_file,img_name,width,height,blocks,conf,rand):
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+        '<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"',
+        '    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">',
+        '<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">',
+        ' <head>',
+        '  <title></title>',
+        '  <meta http-equiv="Content-Type" content="text/html;charset=utf-8"/>',
+        "  <meta name='ocr-system' content='tesseract 4.1.1' />",
+        ' </head>',
+        ' <body>',
+        "  <div class='ocr_page' id='page_1' title='image \"%s\"; bbox 0 0 %d %d; ppageno 0'>" %
+            (img_name,width,height)]
+    bcnt = pcnt = lcnt = wcnt = 1
+    for pars in blocks:
+        words = [word for lines in pars for line in lines for word in line]
+        if len(words) == 0:
+            continue
+        out.append("   <div class='ocr_carea' id='block_1_%d' title='bbox %d %d %d %d'>" %
+            ((bcnt,) + boxOf(words)))
+        bcnt += 1
+        for lines in pars:
+            pwords = [word for line in lines for word in line]
+            out.append("    <p class='ocr_par' id='par_1_%d' lang='eng' title='bbox %d %d %d %d'>" %
+                ((pcnt,) + boxOf(pwords)))
+            pcnt += 1
+            for line in lines:
+                out.append("     <span class='ocr_line' id='line_1_%d' title='bbox %d %d %d %d; "
+                    "baseline 0 -8; x_size 28; x_descenders 6; x_ascenders 7'>" % ((lcnt,) + boxOf(line)))
+                lcnt += 1
+                for wtext, x0, y0, x1, y1 in line:
+                    wconf = max(0,min(99,int(rand.gauss(conf,18))))
+                    out.append("      <span class='ocrx_word' id='word_1_%d' title='bbox %d %d %d %d; "
+                        "x_wconf %d'>%s</span>" % (wcnt,x0,y0,x1,y1,wconf,
+                        wtext.replace("&","&amp;")))
+                    wcnt += 1
+                out.append("     </span>")
+            out.append("    </p>")
+        out.append("   </div>")
+    out += ["  </div>"," </body>","</html>"]
+    with open(hocr_file,"w") as outfile:
+        outfile.write("\n".join(out) + "\n")
+
+""" greyish paper with a stroke for each word """
+def writeImage(img_file,width,height,blocks,rand):
+    img = Image.effect_noise((width,height),18).point(lambda v: 150 + v // 3).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for pars in blocks:
+        for lines in pars:
+            for line in lines:
+                for wtext, x0, y0, x1, y1 in line:
+                    draw.rectangle((x0,y0 + (y1 - y0) // 4,x1,y1),
+                        fill=(rand.randint(10,60),) * 3)
+    if img_file.endswith(".jpg"):
+        img.save(img_file,quality=85)
+    else:
+        img.save(img_file)
+
+""" synthetic collection, returns the issue folders """
+def makeCollection(folder,title="SYNTH",issues=1,pages=2,words=8000,pars=300,
+    blocks=60,conf=75,ext="jpg",size=(5000,7000),seed=1):
+    rand = random.Random(seed)
+    width, height = size
+    issue_folders = []
+    start = datetime(1875,1,1)
+    for icnt in range(issues):
+        issue_date = (start + timedelta(days=7 * icnt)).strftime("%Y-%m-%d")
+        issue_folder = folder + "/" + title + "/" + issue_date
+        os.makedirs(issue_folder,exist_ok=True)
+        for pcnt in range(1,pages + 1):
+            page_base = "%s/%s-%04d" % (issue_folder,issue_date,pcnt)
+            page_blocks = layoutPage(width,height,words,pars,blocks,rand)
+            writeHocr(page_base + ".hocr",os.path.basename(page_base) + "." + ext,
+                width,height,page_blocks,conf,rand)
+            writeImage(page_base + "." + ext,width,height,page_blocks,rand)
+        issue_folders.append(issue_folder)
+    return issue_folders
+
+""" options shared with stageBench.py """
+def addIssueArgs(parser):
+    parser.add_argument("-t","--title", default="SYNTH",
+        help="title folder for the collection")
+    parser.add_argument("-i","--issues", default=1, type=int,
+        help="number of issues")
+    parser.add_argument("-p","--pages", default=2, type=int,
+        help="number of pages per issue")
+    parser.add_argument("-w","--words", default=8000, type=int,
+        help="number of words per page")
+    parser.add_argument("-a","--pars", default=300, type=int,
+        help="number of paragraphs per page")
+    parser.add_argument("-b","--blocks", default=60, type=int,
+        help="number of blocks per page")
+    parser.add_argument("-c","--conf", default=75, type=int,
+        help="mean word confidence, 0-99")
+    parser.add_argument("-e","--ext", default="jpg",
+        help="page image format, jpg or tiff")
+    parser.add_argument("-s","--size", default="5000x7000",
+        help="page size in pixels (wxh)")
+
+""" makeCollection keywords from parsed options """
+def issueKwargs(args):
+    width, height = args.size.split('x')
+    return { "title" : args.title, "issues" : args.issues, "pages" : args.pages,
+        "words" : args.words, "pars" : args.pars, "blocks" : args.blocks,
+        "conf" : args.conf, "ext" : args.ext, "size" : (int(width),int(height)) }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o","--out", default="synth",
+        help="folder to write the collection into")
+    addIssueArgs(parser)
+    args = parser.parse_args()
+
+    for issue_folder in makeCollection(args.out,**issueKwargs(args)):
+        print(issue_folder)
@@ -0,0 +1,75 @@
+"""
+parIndexBench.py - time word to paragraph lookups for the terms build
+
+Usage:
+    python bench/parIndexBench.py [-w WORDS] [-p PARS]
+
+This lays out a synthetic broadsheet page (default 20k words in
+800 paragraphs) and compares the par_index grid lookup used by
+sortOutTermVals against the plain scan of every par_region.
+"""
+
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import odw
+
+PAGE_W = 6000
+PAGE_H = 9000
+
+""" the original lookup, first region in list order that holds the box """
+def scanParRegion(par_regions,x0,y0,x1,y1):
+    for region in par_regions:
+        if x0 >= region.x0 and y0 >= region.y0 and x1 <= region.x1 and y1 <= region.y1:
+            return region
+    return None
+
+""" paragraphs in columns with some overlap, words mostly inside them """
+def makePage(num_words,num_pars,seed):
+    rand = random.Random(seed)
+    pars = []
+    for cnt in range(num_pars):
+        x0 = rand.randint(0,PAGE_W - 400)
+        y0 = rand.randint(0,PAGE_H - 200)
+        x1 = x0 + rand.randint(150,1200)
+        y1 = y0 + rand.randint(60,900)
+        pars.append(odw.par_region(0,x0,y0,x1,y1,"%08d_%08d_%08d_%08d_%05d" %
+            (x0,y0,x1,y1,0)))
+
+    boxes = []
+    for cnt in range(num_words):
+        x0 = rand.randint(0,PAGE_W - 100)
+        y0 = rand.randint(0,PAGE_H - 40)
+        boxes.append((x0,y0,x0 + rand.randint(10,100),y0 + rand.randint(10,40)))
+    return pars, boxes
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-w","--words", default=20000, type=int,
+    help="number of words on the page")
+parser.add_argument("-p","--pars", default=800, type=int,
+    help="number of paragraph regions on the page")
+parser.add_argument("-s","--seed", default=1, type=int,
+    help="random seed for page layout")
+args = parser.parse_args()
+
+pars, boxes = makePage(args.words,args.pars,args.seed)
+
+start = time.perf_counter()
+scan_hits = [scanParRegion(pars,*box) for box in boxes]
+scan_time = time.perf_counter() - start
+
+start = time.perf_counter()
+pindex = odw.par_index(pars)
+build_time = time.perf_counter() - start
+index_hits = [odw.findParRegion(pindex,*box) for box in boxes]
+index_time = time.perf_counter() - start
+
+if scan_hits != index_hits:
+    print("mismatch between scan and par_index results")
+    sys.exit(1)
+
+print("words: %d pars: %d hits: %d" % (len(boxes),len(pars),
+    sum(1 for hit in index_hits if hit is not None)))
+print("scan:      %8.3f s" % scan_time)
+print("par_index: %8.3f s (build %.3f s)" % (index_time,build_time))
+print("speedup:   %8.1fx" % (scan_time/index_time))
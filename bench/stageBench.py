@@ -0,0 +1,198 @@
+"""
+stageBench.py - time each processing stage and the whole script on synthetic issues
+
+Usage:
+    python bench/stageBench.py [-d FOLDER] [-r REPEATS] [-o RESULTS] [-x OLD_RESULTS]
+        [--flags="FLAGS"] [issue options, see makeIssues.py]
+
+A collection is generated with makeIssues.py (or reused if -d already
+has one) and every page is run through the stages one at a time:
+
+- hocr: readHocr and filterWords, parsing and filtering the words
+- words: runThruWords, writing the cleaned _odw.hocr
+- decode: getPageImage
+- blocks: runThruBlocks
+- terms: sortOutESJson
+- tiles: runThruTiles
+- zips: runThruZips, once per issue
+
+The pipeline figure is odwHocrBlockIiif.py itself run over the whole
+collection with --flags (default "-b -v") and the collection's --ext.
+The flags start with a dash, so they have to be given with an equals sign,
+--flags="-b -v -z 2", or argparse takes them for options of its own.
+Results are written as JSON with the commit, so runs can be compared with -x.
+"""
+
+import argparse, contextlib, json, os, platform, shutil, statistics, subprocess
+import sys, tempfile, time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+import odw
+import makeIssues
+
+SCRIPT = os.path.join(BENCH_DIR, '..', 'odwHocrBlockIiif.py')
+STAGES = ["hocr","words","decode","blocks","terms","tiles","zips"]
+
+""" run the stages over every page of the collection once, returns seconds by stage """
+def runStages(coll_folder,title,args):
+    times = dict((stage,0.0) for stage in STAGES)
+    out_dir = tempfile.mkdtemp(prefix="stage_")
+    cwd = os.getcwd()
+    os.chdir(coll_folder) # page paths start with the title, as the script expects
+    try:
+        for issue_folder in sorted(os.listdir(title)):
+            folder = title + "/" + issue_folder
+            ia_folder = folder.replace('/','_').replace('-','')
+            zip_dirs = []
+            for hfile in sorted(os.listdir(folder)):
+                if not hfile.endswith(".hocr") or hfile.endswith("_odw.hocr"):
+                    continue
+                file_base = folder + "/" + hfile.rsplit('.',1)[0]
+                jfile = file_base.rsplit('/',1)[1]
+                jfile_base = ia_folder + '/' + jfile
+
+                start = time.perf_counter()
+                cols, page_node = odw.readHocr(file_base + ".hocr")
+                words = odw.filterWords(cols,args.conf_cut,False)
+                times["hocr"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                par_regions = odw.runThruWords(file_base,words,page_node,args.conf_cut,
+                    "eng",title)
+                times["words"] += time.perf_counter() - start
+
+                pimg = odw.page_image(file_base + "." + args.ext)
+                start = time.perf_counter()
+                odw.getPageImage(pimg)
+                times["decode"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                zip_dir, par_regions = odw.runThruBlocks(jfile_base,pimg,out_dir,
+                    par_regions,False,"300x200x10")
+                times["blocks"] += time.perf_counter() - start
+                zip_dirs.append(zip_dir)
+
+                json_page = { "pid" : title + "_" + jfile, "title" : title,
+                    "is_member_of_collection" : title, "mime_type" : "image/" + args.ext,
+                    "language" : "eng", "full_text" : "" }
+                start = time.perf_counter()
+                odw.sortOutESJson(json_page,title,out_dir + "/build/" + ia_folder,jfile,
+                    words,par_regions)
+                times["terms"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                zip_dirs.append(odw.runThruTiles(jfile_base,pimg,out_dir,False))
+                times["tiles"] += time.perf_counter() - start
+                odw.releasePageImage(pimg)
+
+            start = time.perf_counter()
+            odw.runThruZips(out_dir + "/cloud/" + ia_folder + "/",ia_folder,zip_dirs)
+            times["zips"] += time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(out_dir)
+    return times
+
+""" run the script over the whole collection, returns seconds """
+def runPipeline(coll_folder,title,flags,ext):
+    out_dir = tempfile.mkdtemp(prefix="pipeline_")
+    try:
+        start = time.perf_counter()
+        subprocess.run([sys.executable,os.path.abspath(SCRIPT),"-f",title,"-o",out_dir,
+            "-e",ext,"-r"] + flags.split(),cwd=coll_folder,check=True,
+            stdout=subprocess.DEVNULL)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir)
+        if os.path.exists(os.path.join(coll_folder,title + ".sh")):
+            os.remove(os.path.join(coll_folder,title + ".sh"))
+
+""" runs with their min and median, per page as well """
+def summary(runs,num_pages):
+    median = statistics.median(runs)
+    return { "runs" : [round(run,4) for run in runs], "min" : round(min(runs),4),
+        "median" : round(median,4), "per_page" : round(median / num_pages,4) }
+
+""" commit the numbers are for, if this is a git checkout """
+def gitCommit():
+    try:
+        return subprocess.run(["git","-C",BENCH_DIR,"rev-parse","--short","HEAD"],
+            capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-d","--data", default=None,
+    help="folder for the synthetic collection, kept and reused if given")
+parser.add_argument("-r","--repeats", default=3, type=int,
+    help="number of times to run each stage and the pipeline")
+parser.add_argument("-o","--out", default="stageBench.json",
+    help="file for the JSON results")
+parser.add_argument("-x","--compare", default=None,
+    help="earlier results to compare against")
+parser.add_argument("-f","--flags", default="-b -v",
+    help="odwHocrBlockIiif.py flags for the pipeline run, empty to skip it; give them "
+        "as --flags=\"-b -v\" since they start with a dash")
+parser.add_argument("-n","--conf-cut", default=50, type=int,
+    help="confidence threshold passed to the stages, as --conf")
+makeIssues.addIssueArgs(parser)
+args = parser.parse_args()
+
+issue_kwargs = makeIssues.issueKwargs(args)
+tmp_dir = None
+coll_folder = args.data
+if coll_folder is None:
+    tmp_dir = tempfile.TemporaryDirectory(prefix="synth_")
+    coll_folder = tmp_dir.name
+if not os.path.exists(os.path.join(coll_folder,args.title)):
+    print("generating", args.issues, "issue(s) of", args.pages, "page(s) in", coll_folder)
+    makeIssues.makeCollection(coll_folder,**issue_kwargs)
+num_pages = sum(1 for issue in os.listdir(os.path.join(coll_folder,args.title))
+    for hfile in os.listdir(os.path.join(coll_folder,args.title,issue))
+    if hfile.endswith(".hocr") and not hfile.endswith("_odw.hocr"))
+
+stage_runs = dict((stage,[]) for stage in STAGES)
+for cnt in range(args.repeats):
+    with contextlib.redirect_stdout(open(os.devnull,"w")):
+        times = runStages(coll_folder,args.title,args)
+    for stage in STAGES:
+        stage_runs[stage].append(times[stage])
+
+pipeline_runs = []
+if len(args.flags.strip()) > 0:
+    for cnt in range(args.repeats):
+        pipeline_runs.append(runPipeline(coll_folder,args.title,args.flags,args.ext))
+
+results = { "commit" : gitCommit(),
+    "date" : datetime.now().isoformat(timespec="seconds"),
+    "python" : platform.python_version(),
+    "tiler" : "vips" if odw.getVips() is not None else "pil",
+    "params" : dict(issue_kwargs,size="%dx%d" % issue_kwargs["size"],repeats=args.repeats,
+        conf_cut=args.conf_cut,flags=args.flags,num_pages=num_pages),
+    "stages" : dict((stage,summary(stage_runs[stage],num_pages)) for stage in STAGES) }
+if len(pipeline_runs) > 0:
+    results["pipeline"] = summary(pipeline_runs,num_pages)
+
+with open(args.out,"w") as outfile:
+    json.dump(results,outfile,indent=4)
+
+old = None
+if args.compare is not None:
+    with open(args.compare) as f:
+        old = json.load(f)
+
+print("%-10s %10s %10s" % ("stage","median s","per page") +
+    ("   vs %s" % old["commit"] if old is not None else ""))
+rows = [(stage,results["stages"][stage]) for stage in STAGES]
+if "pipeline" in results:
+    rows.append(("pipeline",results["pipeline"]))
+for name, result in rows:
+    line = "%-10s %10.3f %10.3f" % (name,result["median"],result["per_page"])
+    if old is not None:
+        old_result = old.get("pipeline") if name == "pipeline" else old["stages"].get(name)
+        if old_result is not None and old_result["median"] > 0:
+            line += "   %5.2fx" % (result["median"] / old_result["median"])
+    print(line)
+print("results in", args.out)
@@ -0,0 +1,131 @@
+"""
+thumbBench.py - time the FULL_TILES derivatives for a page image
+
+Usage:
+    python bench/thumbBench.py [-i IMAGE] [-g GAP] [-t TOLERANCE]
+
+Each approach runs in its own process so the peak RSS figures are
+not mixed up:
+
+- exact: LANCZOS from the full page with no reduce() first, slow but
+  the closest there is, the others are measured against it
+- copy: the old way, a full size copy() and thumbnail() per size
+- cascade: addFullTiles from a page that is already decoded
+- draft: addFullTiles from a JPEG that is not decoded yet
+
+The mean pixel difference (0-255) of each derivative against the
+exact version is shown so THUMB_GAP can be weighed against the time
+saved, and the script exits 1 if cascade or draft is more than
+TOLERANCE (THUMB_TOLERANCE) off at any width. copy is not held to it,
+its 1-3 pixel wide derivatives come from two or three reduce()d
+columns and are well off the page's average colour.
+Without -i, a synthetic 6000x9000 newspaper page is used.
+"""
+
+import argparse, io, os, resource, sys, tempfile, time, zipfile
+import multiprocessing as mp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import odw
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+""" noisy page with lines of 'text' """
+def makePage(img_file):
+    img = Image.effect_noise((6000,9000),24).convert('RGB')
+    draw = ImageDraw.Draw(img)
+    for y in range(100,8900,40):
+        for x in range(100,5900,300):
+            draw.text((x,y),"The Amherstburg Echo %d" % y,fill=(20,20,20))
+    img.save(img_file,quality=90)
+
+""" run one approach, returns timing, peak rss and the jpegs by size """
+def runApproach(approach,img_file,gap):
+    start = time.perf_counter()
+    tiles = {}
+
+    if approach == 'exact':
+        img = Image.open(img_file)
+        img.load()
+        w,h = img.size
+        for tsize in odw.FULL_TILES:
+            tb_img = img.resize(odw.thumbSize(w,h,tsize),Image.Resampling.LANCZOS)
+            jpg_buffer = io.BytesIO()
+            tb_img.save(jpg_buffer,format='JPEG')
+            tiles[tsize] = jpg_buffer.getvalue()
+    elif approach == 'copy':
+        img = Image.open(img_file)
+        img.load()
+        _,h = img.size
+        for tsize in odw.FULL_TILES:
+            tb_img = img.copy()
+            tb_img.thumbnail((tsize,h),Image.Resampling.LANCZOS)
+            jpg_buffer = io.BytesIO()
+            tb_img.save(jpg_buffer,format='JPEG')
+            tiles[tsize] = jpg_buffer.getvalue()
+    else:
+        pimg = odw.page_image(img_file)
+        if approach == 'cascade':
+            odw.getPageImage(pimg)
+        zip_buffer = io.BytesIO()
+        zwriter = odw.zip_writer(zip_buffer,'tiles')
+        odw.addFullTiles(zwriter,pimg,'tiles',gap)
+        zwriter.zipf.close()
+        odw.releasePageImage(pimg)
+        with zipfile.ZipFile(zip_buffer) as zipf:
+            for tsize in odw.FULL_TILES:
+                tiles[tsize] = zipf.read("tiles/full/%d,/0/default.jpg" % tsize)
+
+    elapsed = time.perf_counter() - start
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, tiles
+
+""" mean absolute pixel difference between two jpegs """
+def pixelDiff(jpg_a,jpg_b):
+    img_a = Image.open(io.BytesIO(jpg_a))
+    img_b = Image.open(io.BytesIO(jpg_b))
+    if img_a.size != img_b.size:
+        return None
+    diff = ImageStat.Stat(ImageChops.difference(img_a,img_b))
+    return sum(diff.mean)/len(diff.mean)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i","--image",
+    help="page image to use, a synthetic JPEG page by default")
+parser.add_argument("-g","--gap", default=odw.THUMB_GAP, type=float,
+    help="source/derivative width ratio for cascading (THUMB_GAP)")
+parser.add_argument("-t","--tolerance", default=odw.THUMB_TOLERANCE, type=float,
+    help="mean pixel difference allowed for cascade and draft (THUMB_TOLERANCE)")
+args = parser.parse_args()
+
+if __name__ == "__main__":
+    td = tempfile.TemporaryDirectory()
+    ctx = mp.get_context('spawn')
+    img_file = args.image
+    if img_file is None:
+        #page is made in another process to keep this one (and so the
+        #peak rss the workers start out with) small
+        img_file = td.name + "/page.jpg"
+        with ctx.Pool(1) as pool:
+            pool.apply(makePage,(img_file,))
+
+    results = {}
+    for approach in ('exact','copy','cascade','draft'):
+        with ctx.Pool(1) as pool:
+            results[approach] = pool.apply(runApproach,(approach,img_file,args.gap))
+
+    print("image: %s gap: %.1f tolerance: %.1f" % (img_file,args.gap,args.tolerance))
+    print("%-8s %9s %12s  mean pixel diff by width %s" % ("approach","time (s)",
+        "peak rss MB",odw.FULL_TILES))
+    failed = []
+    for approach, (elapsed, rss, tiles) in results.items():
+        diffs = []
+        for tsize in odw.FULL_TILES:
+            diff = pixelDiff(results['exact'][2][tsize],tiles[tsize])
+            diffs.append("size!" if diff is None else "%.1f" % diff)
+            if approach in ('cascade','draft') and (diff is None or diff > args.tolerance):
+                failed.append("%s %d" % (approach,tsize))
+        print("%-8s %9.3f %12.1f  %s" % (approach,elapsed,rss/1024," ".join(diffs)))
+    td.cleanup()
+
+    if len(failed) > 0:
+        print("over tolerance:",", ".join(failed))
+        sys.exit(1)
@@ -0,0 +1,63 @@
+"""
+odw - create outputs for ODW from hocr files and page images
+
+The stages odwHocrBlockIiif.py runs, as a library. An issue folder goes
+through them with runThruIssue, or pages can be pulled through the stage
+objects one at a time:
+
+    import odw
+    pages = [odw.page_job(hfile,ia_folder,"jpg") for hfile in hfiles]
+    for stage in (odw.parse_stage(args),odw.filter_stage(args),odw.rebuild_stage(args)):
+        pages = stage(pages)
+    for page in pages:
+        ...
+
+Nothing is imported until it is first used, so importing odw is cheap and
+numpy, Pillow and pyvips are only loaded by the stages that need them.
+"""
+
+import importlib
+
+_modules = {
+    "consts" : ["PAGE_INDEX","TERMS_INDEX","JS_TYPE","ND_TYPE","HOCR_NS","MARGIN",
+        "TILE_SIZE","GRID_SIZE","VIPS_ID","FULL_TILES","STAGE_NAMES","THUMB_GAP",
+        "THUMB_TOLERANCE"],
+    "hocr" : ["par_region","word_table","word_cols","readHocr","sortOutHocr",
+        "filterWords","runThruWords"],
+    "terms" : ["par_index","addParRegion","findParRegion","sortOutESJson","packTerms",
+        "expandTerms","readTerms"],
+    "hits" : ["normTerm","pageHits","writeHits","readHitsHead","findHits","readHits"],
+    "bulk" : ["bulk_writer","addBulkLines","closeBulkWriter","loadBulk"],
+    "zips" : ["zip_info","zip_writer","findZipDir","findZipIndex","createZipImages",
+        "runThruZips"],
+    "images" : ["getVips","pixel_budget","page_image","getPageImage","getPageSize",
+        "getPageRegion","releasePageImage","runThruBlocks","thumbSize","addFullTiles",
+        "runThruTiles"],
+    "metrics" : ["stage_log","logStage","newStageLog","writeMetrics"],
+    "ledger" : ["readLedger","writeLedger"],
+    "stages" : ["page_job","page_stage","parse_stage","filter_stage","rebuild_stage",
+        "blocks_stage","tiles_stage","index_stage","hits_stage","package_stage",
+        "sortOutJson"],
+    "issue" : ["runThruPage","runThruPages","runThruIssue","publishFolder","runIssue",
+        "writeBuildLines"],
+    "pipeline" : ["runThruPipeline"],
+    "shard" : ["parseShard","folderCost","shardFolders","runMerge"],
+    "spool" : ["runSpool"],
+    "cli" : ["parser","main"],
+}
+_names = dict((name,module) for module, names in _modules.items() for name in names)
+
+__all__ = list(_names)
+
+""" load the module a name lives in the first time it is asked for """
+def __getattr__(name):
+    if name in _modules:
+        return importlib.import_module("." + name,__name__)
+    if name not in _names:
+        raise AttributeError("module %r has no attribute %r" % (__name__,name))
+    value = getattr(importlib.import_module("." + _names[name],__name__),name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,134 @@
+"""
+bulk.py - gather pages into ElasticSearch _bulk files and load them
+"""
+
+import gzip, http.client, json, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from . import consts
+from .consts import ND_TYPE, GZ_TYPE
+from .terms import termsNdjson
+
+""" bulk_writer - size capped _bulk files for each index, in the order pages are added """
+class bulk_writer:
+    def __init__(self, bulk_base, cap, gz=False):
+        self.bulk_base = bulk_base
+        self.cap = cap # bytes, a file is started over once it would go past this
+        self.gz = gz # write .ndjson.gz, sent to ElasticSearch compressed
+        self.files = {} # index -> [file name, bytes written, file object]
+        self.bulk_files = [] # (index, file name) in the order they were started
+
+""" add pages' NDJSON pieces to the _bulk file for their index, compact
+    terms files are expanded back to the terms document """
+def addBulkLines(bwriter,build_lines):
+    for index, json_file in build_lines:
+        if json_file.endswith(".gz"):
+            data = termsNdjson(json_file)
+        else:
+            with open(json_file,"rb") as f:
+                data = f.read()
+        bfile = bwriter.files.get(index)
+        if bfile is not None and bfile[1] > 0 and bfile[1] + len(data) > bwriter.cap:
+            bfile[2].close()
+            bfile = None
+        if bfile is None:
+            bulk_file = "%s_%s_%04d.ndjson" % (bwriter.bulk_base,index.rsplit('/',1)[1],
+                sum(1 for bulk in bwriter.bulk_files if bulk[0] == index) + 1)
+            if bwriter.gz:
+                bulk_file += ".gz"
+                bfile = [bulk_file, 0, gzip.open(bulk_file,"wb",compresslevel=6)]
+            else:
+                bfile = [bulk_file, 0, open(bulk_file,"wb")]
+            bwriter.files[index] = bfile
+            bwriter.bulk_files.append((index,bulk_file))
+        bfile[2].write(data)
+        bfile[1] += len(data)
+
+""" finish _bulk files, returns lines for the build script """
+def closeBulkWriter(bwriter):
+    for bfile in bwriter.files.values():
+        bfile[2].close()
+    return ["curl -XPOST \"%s/_bulk\" -H \"%s\"%s --data-binary @%s\n" %
+        (index,ND_TYPE," -H \"%s\"" % GZ_TYPE if bulk_file.endswith(".gz") else "",bulk_file)
+        for index, bulk_file in bwriter.bulk_files]
+
+""" keep-alive connection to ElasticSearch, one per thread and host """
+def getConn(conns,parts):
+    if not hasattr(conns,"hosts"):
+        conns.hosts = {}
+    conn = conns.hosts.get(parts.netloc)
+    if conn is None:
+        if parts.scheme == "https":
+            conn = http.client.HTTPSConnection(parts.netloc,timeout=300)
+        else:
+            conn = http.client.HTTPConnection(parts.netloc,timeout=300)
+        conns.hosts[parts.netloc] = conn
+    return conn
+
+""" post one _bulk file, busy or failed requests and items are retried with
+    a growing wait, returns (docs loaded, docs failed) """
+def postBulk(conns,index,bulk_file,retries):
+    parts = urlsplit(index)
+    gz = bulk_file.endswith(".gz")
+    headers = { "Content-Type" : ND_TYPE.split(": ",1)[1] }
+    if gz:
+        headers["Content-Encoding"] = GZ_TYPE.split(": ",1)[1]
+    with (gzip.open if gz else open)(bulk_file,"rb") as f:
+        lines = f.read().splitlines(keepends=True)
+    pairs = [lines[i] + lines[i + 1] for i in range(0,len(lines) - 1,2)]
+    loaded = 0
+    failed = 0
+    wait = consts.BULK_RETRY
+
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(wait)
+            wait *= 2
+        try:
+            conn = getConn(conns,parts)
+            body = b"".join(pairs)
+            conn.request("POST",parts.path + "/_bulk",
+                gzip.compress(body,6) if gz else body,headers)
+            resp = conn.getresponse()
+            body = resp.read()
+        except (OSError, http.client.HTTPException):
+            conns.hosts.pop(parts.netloc).close() # start over with a new connection
+            continue
+        if resp.status == 429 or resp.status >= 500:
+            continue
+        if resp.status != 200:
+            print("bulk load of", bulk_file, "failed:", resp.status, body[:200])
+            return loaded, failed + len(pairs)
+
+        #only the items ElasticSearch was too busy for are sent again
+        items = json.loads(body)["items"]
+        busy = []
+        for pair, item in zip(pairs,items):
+            status = list(item.values())[0]["status"]
+            if status < 300:
+                loaded += 1
+            elif status == 429 or status >= 500:
+                busy.append(pair)
+            else:
+                failed += 1
+                print("bulk item in", bulk_file, "failed:", list(item.values())[0].get("error"))
+        if len(busy) == 0:
+            return loaded, failed
+        pairs = busy
+
+    print("bulk load of", bulk_file, "gave up after", retries, "retries")
+    return loaded, failed + len(pairs)
+
+""" load _bulk files over a few keep-alive connections, only that many files
+    are read and in flight at once, returns (docs loaded, docs failed) """
+def loadBulk(bulk_files,conn_cnt=4,retries=5):
+    conns = threading.local()
+    loaded = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(conn_cnt,1)) as pool:
+        for bloaded, bfailed in pool.map(lambda bulk: postBulk(conns,bulk[0],bulk[1],
+            retries),bulk_files):
+            loaded += bloaded
+            failed += bfailed
+    return loaded, failed
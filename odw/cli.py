@@ -0,0 +1,195 @@
+"""
+cli.py - command line for odwHocrBlockIiif.py, the options and the loop over issue folders or jobs
+"""
+
+import argparse, glob, os, pstats, sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .bulk import bulk_writer, closeBulkWriter, loadBulk
+from .consts import STAGE_NAMES
+from .issue import runIssueWorker, issueResult, writeBuildLines
+from .metrics import writeMetrics
+from .shard import parseShard, folderCost, shardFolders, shardBase, writeShard, runMerge
+from .spool import runSpool
+
+#parser values
+parser = argparse.ArgumentParser()
+arg_named = parser.add_argument_group("named arguments")
+arg_named.add_argument("-b",'--block', action='store_true', 
+    default=False,
+    help="flag to create image blocks")
+arg_named.add_argument("-k",'--bulk', default=0, type=int,
+    help="size cap in MB for ElasticSearch _bulk files, 0 for a JSON file per page")
+arg_named.add_argument("-a",'--terms', type=str,
+    default="json", choices=["json","packed"],
+    help="terms documents as JSON, or packed as gzip'd columns (also gzips _bulk files)")
+arg_named.add_argument('-e', '--ext', type=str, 
+    default="jpg",
+    help="extension of image format, e.g. tiff")
+arg_named.add_argument("-f","--folder", 
+    help="input folder (contains hocr files)")
+arg_named.add_argument("-c","--conf", default=50, type=int,
+    help="set confidence number threshold for ocr words")
+arg_named.add_argument("-d",'--dir', action='store_true', 
+    default=False,
+    help="flag to create folder of zip dirs")
+arg_named.add_argument("-y",'--hits', action='store_true',
+    default=False,
+    help="flag to add an index of the issue's words by term (hits.bin) to odw.zip")
+arg_named.add_argument('-g', '--geocode', type=str, 
+    default="42.09576196289635, -83.10487506923508",
+    help="lat,lon for newspaper")
+arg_named.add_argument("-j",'--json', action='store_true', 
+    default=True,
+    help="flag to create JSON build file(s)")
+arg_named.add_argument("-i",'--metrics', type=str,
+    default=None,
+    help="file for per stage timing and memory, .csv or .json")
+arg_named.add_argument('-l', '--lang', type=str, 
+    default="eng",
+    help="language for OCR")
+arg_named.add_argument('-m', '--min', type=str, 
+    default="300x200x10",
+    help="minimum dims for para/block with word count (wxhxc), e.g. 300x200x10")
+arg_named.add_argument("-n",'--number', action='store_true', 
+    default=False,
+    help="flag to bypass confidence value for words with number(s)")
+arg_named.add_argument('-o', '--out', type=str, 
+    default="results6",
+    help="folder for processing results")
+arg_named.add_argument("-s",'--profile', type=str,
+    default=None, choices=STAGE_NAMES,
+    help="stage to run under cProfile, needs --metrics")
+arg_named.add_argument("-q",'--spool', type=str,
+    default=None,
+    help="folder to watch for .job files, runs as a daemon until stopped")
+arg_named.add_argument("-r",'--rebuild', action='store_true',
+    default=False,
+    help="flag to rebuild every page, even if unchanged since the last run")
+arg_named.add_argument('-t', '--title', type=str, 
+    default="The Amherstburg Echo",
+    help="title to set for HOCR file(s)")
+arg_named.add_argument("-p",'--pages', default=1, type=int,
+    help="number of pages within an issue to process at once")
+arg_named.add_argument("-u",'--upload', default=0, type=int,
+    help="number of connections for loading _bulk files into ElasticSearch, 0 to skip")
+arg_named.add_argument("-v",'--vips', action='store_true', 
+    default=False,
+    help="flag to create IIIF tiles (with libvips if pyvips is installed)")
+arg_named.add_argument("-x",'--memory', default=0, type=int,
+    help="cap in MB for decoded page images held at once by each worker, 0 for no cap")
+arg_named.add_argument("-z",'--queue', default=0, type=int,
+    help="pages held between stages when an issue's pages go through them at once, 0 for a page at a time")
+arg_named.add_argument("-w",'--workers', default=1, type=int,
+    help="number of issue folders to process at once")
+arg_named.add_argument('--shard', type=str,
+    default=None,
+    help="i/n, process the i-th of n shares of the issue folders, weighed by pages and image bytes")
+arg_named.add_argument('--merge', action='store_true',
+    default=False,
+    help="flag to put the --shard build scripts or _bulk files together, once every issue is built")
+
+""" run the script with argv (sys.argv by default) """
+def main(argv=None):
+    args = parser.parse_args(argv)
+
+    #daemon mode, issue folders come from the job files instead
+    if args.spool is not None:
+        runSpool(args)
+        return
+
+    #the shards are done, their build lines go together in folder order
+    if args.merge and args.folder is not None:
+        runMerge(args)
+        return
+
+    # if args.folder == None or not os.path.exists(args.folder):
+    if args.folder == None or not os.path.exists(args.folder):
+        print("missing hocr folder, use '-h' parameter for syntax")
+        sys.exit()
+
+    #a shard's build script and _bulk files are kept with the results for --merge
+    build_base = args.folder
+    bulk_base = args.out + "/build/" + os.path.basename(args.folder.rstrip('/'))
+    shard = None
+    if args.shard is not None:
+        shard = parseShard(args.shard)
+        if shard is None:
+            parser.error("--shard is i/n with i from 1 to n, e.g. 2/4")
+        build_base = bulk_base = shardBase(args,*shard)
+        Path(args.out + "/build").mkdir(parents=True, exist_ok=True)
+        if os.path.exists(build_base + ".json"):
+            os.remove(build_base + ".json")
+
+    #clear out build file if it exists
+    if args.json:
+        if os.path.exists(build_base + ".sh"):
+            os.remove(build_base + ".sh")
+
+    #and any _bulk files, these are put together again from each page's NDJSON
+    bwriter = None
+    if args.bulk > 0:
+        Path(args.out + "/build").mkdir(parents=True, exist_ok=True)
+        for bulk_file in glob.glob(bulk_base + "_*_[0-9][0-9][0-9][0-9].ndjson*"):
+            os.remove(bulk_file)
+        bwriter = bulk_writer(bulk_base,args.bulk * 1024 * 1024,args.terms == "packed")
+
+    #profiles from an earlier run would be counted again
+    if args.metrics is not None:
+        for prof_file in glob.glob(args.out + "/metrics/*.prof"):
+            os.remove(prof_file)
+
+    folders = sorted(glob.glob(args.folder + "/*"))
+    if shard is not None:
+        folders = shardFolders(folders,shard[0],shard[1],args.ext)
+        print("shard %d of %d: %d issue(s), weight %d" % (shard[0],shard[1],len(folders),
+            sum(folderCost(folder,args.ext) for folder in folders)))
+    failed = []
+    metric_rows = []
+    issue_lines = {} # build lines for each issue, for --merge
+
+    #a failing issue is reported the same way with or without workers
+    pool = None
+    if args.workers > 1:
+        #issues can finish in any order, build lines are added in folder order
+        pool = ProcessPoolExecutor(max_workers=args.workers)
+        futures = [pool.submit(runIssueWorker,folder,args) for folder in folders]
+        results = (issueResult(folder,future) for folder, future in zip(folders,futures))
+    else:
+        results = (runIssueWorker(folder,args) for folder in folders)
+    try:
+        for folder, build_lines, rows, err in results:
+            metric_rows += rows
+            if err is None:
+                issue_lines[folder] = build_lines
+                writeBuildLines(build_base,build_lines,bwriter)
+            else:
+                print("failed:",folder)
+                print(err)
+                failed.append(folder)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if bwriter is not None:
+        writeBuildLines(build_base,closeBulkWriter(bwriter))
+        if args.upload > 0:
+            loaded, not_loaded = loadBulk(bwriter.bulk_files,args.upload)
+            print("loaded %d document(s) into ElasticSearch, %d failed" %
+                (loaded,not_loaded))
+
+    if shard is not None:
+        writeShard(build_base,shard[0],shard[1],args,issue_lines,failed)
+
+    if args.metrics is not None:
+        writeMetrics(args.metrics,metric_rows)
+        prof_files = sorted(glob.glob(args.out + "/metrics/" + str(args.profile) + "_*.prof"))
+        if len(prof_files) > 0:
+            print("profile of", args.profile, "stage, from", len(prof_files), "run(s):")
+            pstats.Stats(*prof_files).sort_stats("cumulative").print_stats(20)
+
+    if len(failed) > 0:
+        print("%d of %d issue(s) failed: %s" % (len(failed),len(folders),
+            ", ".join(failed)))
+        sys.exit(1)
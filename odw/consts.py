@@ -0,0 +1,53 @@
+"""
+consts.py - settings shared by the odw stages
+"""
+
+PAGE_INDEX = 'http://localhost:9200/digitaldu_odw'
+TERMS_INDEX = 'http://localhost:9200/termsinde'
+JS_TYPE = 'Content-Type: application/json'
+ND_TYPE = 'Content-Type: application/x-ndjson'
+GZ_TYPE = 'Content-Encoding: gzip'
+TERMS_SCHEMA = 'odw-terms/1' # compact terms files, see expandTerms
+BULK_RETRY = 0.5 # seconds before first retry of a busy _bulk request, doubles each time
+HOCR_NS = 'http://www.w3.org/1999/xhtml' #namespace for HOCR
+HOCR_INDENT = '   '
+ZIP_END = b'PK\x05\x06' # signature for end of zip central directory record
+ZIP_END_SIZE = 22 # end of central directory record, without comment
+ZIP64_LOC = b'PK\x06\x07' # zip64 end of central directory locator
+ZIP64_LOC_SIZE = 20
+ZIP64_END = b'PK\x06\x06' # zip64 end of central directory record
+ZIP64_END_SIZE = 56
+ZIP_INDEX = b'ODWI' # signature for the sorted entry lookup written with --dir
+ZIP_INDEX_HEADER = '<4sHHI' # signature, version, name width, entry count
+ZIP_INDEX_ENTRY = '<QI' # after the NUL padded name, data offset in odw.zip and size
+HITS_INDEX = b'ODWH' # signature for the inverted index written with --hits
+HITS_HEADER = '<4sHHHHIII' # signature, version, term, page and block widths, then counts
+HITS_GROUP = '<QII' # after the NUL padded first term, group offset, size and term count
+HITS_TERM = '<II' # after the NUL padded term, first posting in its group and count
+HITS_POSTING = '<HIiiiiB' # page, block, x0, y0, x1, y1, conf
+HITS_GROUP_TERMS = 64 # terms per group, a lookup reads one group
+HITS_TERM_MAX = 32 # bytes of a term kept, OCR runs on can be much longer
+MARGIN = 5 # additional pixels for coordinates
+TILE_SIZE = 256
+GRID_SIZE = 256 # cell size in pixels for looking up par regions
+VIPS_ID = 'https://ourontario.ca'
+VIPS_ID = '/zipit/?path='
+FULL_TILES = [1,2,3,7,13,26,52,90,104,200]
+STAGE_NAMES = ["issue","ledger","parse","filter","rebuild","blocks","tiles","index","hits",
+    "package","images","publish"] # stages logged with --metrics
+THUMB_GAP = 2.0 # FULL_TILES source must be this many times wider, higher is closer to full size
+THUMB_TOLERANCE = 4.0 # mean pixel difference (0-255) bench/thumbBench.py allows a FULL_TILES derivative
+AT_FDCWD = -100 # renameat2 arguments for swapping a published issue in one step (linux)
+RENAME_EXCHANGE = 2
+SPOOL_POLL = 2.0 # seconds between looks at the --spool folder for new jobs
+SHARD_PAGE_BYTES = 4 * 1024 * 1024 # --shard weighs a page's hocr and JSON work as this many image bytes
+PIPE_POLL = 0.1 # seconds a --queue stage waits on a queue before checking for a stop
+
+#set paths for cat and lynx
+#this part is commented out below
+#but might be useful for quickly checking
+#a text version of the results
+"""
+CAT_CMD = "/bin/cat"
+LYNX_CMD = "/usr/bin/lynx"
+"""
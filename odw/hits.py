@@ -0,0 +1,207 @@
+"""
+hits.py - an issue's words by term, so hits can be found and highlighted without ElasticSearch
+
+With --hits each issue's odw.zip gets a hits.bin, and odw.json says where
+it is (hits_offset, hits_size) and how much of it is head (hits_head_size).
+A viewer reads the head once, then one range read gets a term's postings:
+
+    HITS_HEADER  signature, version, term, page and block widths, and the
+                 number of pages, blocks and groups
+    pages        page idents as in the manifest (jfile_base), NUL padded
+    blocks       bidents, sorted and NUL padded
+    groups       for each run of HITS_GROUP_TERMS terms, its first term NUL
+                 padded and HITS_GROUP, the group's offset in hits.bin,
+                 its size and its number of terms
+    group data   the group's terms NUL padded with HITS_TERM, the first
+                 posting and posting count, then its postings (HITS_POSTING)
+
+Terms are words run through normTerm, sorted by their UTF-8 bytes, and a
+term's postings are in page then word order. As in the terms documents,
+words outside every paragraph region are left out.
+"""
+
+import bisect, json, re, struct, sys
+from pathlib import Path
+
+from .consts import HITS_INDEX, HITS_HEADER, HITS_GROUP, HITS_TERM, HITS_POSTING
+from .consts import HITS_GROUP_TERMS, HITS_TERM_MAX
+from .terms import par_index, findParRegion
+
+TERM_EDGE = re.compile(r'^\W+|\W+$') # punctuation either side of a word
+
+""" hits_head - the tables at the start of hits.bin """
+class hits_head:
+    def __init__(self, size, term_width, pages, blocks, groups):
+        self.size = size # bytes up to the first group
+        self.term_width = term_width
+        self.pages = pages # page idents, a posting's page is a position in these
+        self.blocks = blocks # bidents, likewise
+        self.groups = groups # (padded first term, offset, size, number of terms)
+
+""" term a word is filed under, case folded with punctuation either side
+    dropped, cut to HITS_TERM_MAX bytes; lookups go through this as well """
+def normTerm(wtext):
+    term = TERM_EDGE.sub('',wtext.casefold())
+    return term.encode()[:HITS_TERM_MAX].decode(errors='ignore')
+
+""" (term, x0, y0, x1, y1, conf, bident) for each word of a page in a par region """
+def pageHits(words,par_regions):
+    hits = []
+    pindex = par_index(par_regions)
+
+    wx0 = words.x0.tolist()
+    wy0 = words.y0.tolist()
+    wx1 = words.x1.tolist()
+    wy1 = words.y1.tolist()
+    wconf = words.wconf.tolist()
+
+    for cnt,wtext in enumerate(words.wtext):
+        region = findParRegion(pindex,wx0[cnt],wy0[cnt],wx1[cnt],wy1[cnt])
+        if region is None:
+            continue
+        term = normTerm(wtext)
+        if len(term) > 0:
+            hits.append((term,wx0[cnt],wy0[cnt],wx1[cnt],wy1[cnt],wconf[cnt],region.bident))
+
+    return hits
+
+""" write hits.bin from (page ident, pageHits) pairs in page order, returns the head size """
+def writeHits(hits_file,page_hits):
+    pages = [page.encode() for page, hits in page_hits]
+    blocks = sorted(set(hit[6].encode() for page, hits in page_hits for hit in hits))
+    block_nums = dict((bident,cnt) for cnt,bident in enumerate(blocks))
+
+    postings = {}
+    for pnum, (page, hits) in enumerate(page_hits):
+        for term, x0, y0, x1, y1, conf, bident in hits:
+            postings.setdefault(term.encode(),[]).append(struct.pack(HITS_POSTING,
+                pnum,block_nums[bident.encode()],x0,y0,x1,y1,min(max(conf,0),255)))
+    terms = sorted(postings)
+
+    term_width = max([len(term) for term in terms] + [1])
+    page_width = max([len(page) for page in pages] + [1])
+    block_width = max([len(bident) for bident in blocks] + [1])
+    groups = [terms[cnt:cnt + HITS_GROUP_TERMS] for cnt in range(0,len(terms),HITS_GROUP_TERMS)]
+    head_size = (struct.calcsize(HITS_HEADER) + len(pages) * page_width +
+        len(blocks) * block_width + len(groups) * (term_width + struct.calcsize(HITS_GROUP)))
+
+    #each group is its term rows then the postings they point into
+    group_data = []
+    for gterms in groups:
+        rows = []
+        first = 0
+        for term in gterms:
+            rows.append(term.ljust(term_width,b'\0') +
+                struct.pack(HITS_TERM,first,len(postings[term])))
+            first += len(postings[term])
+        group_data.append(b''.join(rows) +
+            b''.join(posting for term in gterms for posting in postings[term]))
+
+    Path(hits_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(hits_file,"wb") as f:
+        f.write(struct.pack(HITS_HEADER,HITS_INDEX,1,term_width,page_width,block_width,
+            len(pages),len(blocks),len(groups)))
+        for page in pages:
+            f.write(page.ljust(page_width,b'\0'))
+        for bident in blocks:
+            f.write(bident.ljust(block_width,b'\0'))
+        offset = head_size
+        for gterms, data in zip(groups,group_data):
+            f.write(gterms[0].ljust(term_width,b'\0') +
+                struct.pack(HITS_GROUP,offset,len(data),len(gterms)))
+            offset += len(data)
+        for data in group_data:
+            f.write(data)
+
+    return head_size
+
+""" padded names in a table read back as strings """
+def unpadNames(data,width,cnt):
+    return [data[pos:pos + width].rstrip(b'\0').decode() for pos in range(0,width * cnt,width)]
+
+""" hits_head from hits.bin in f, at offset (hits_offset when f is odw.zip) """
+def readHitsHead(f,offset=0):
+    header_size = struct.calcsize(HITS_HEADER)
+    f.seek(offset)
+    magic, version, term_width, page_width, block_width, page_cnt, block_cnt, group_cnt = \
+        struct.unpack(HITS_HEADER,f.read(header_size))
+    if magic != HITS_INDEX:
+        raise ValueError("no hits index at %d" % offset)
+
+    group_size = term_width + struct.calcsize(HITS_GROUP)
+    tables = f.read(page_cnt * page_width + block_cnt * block_width + group_cnt * group_size)
+    pages = unpadNames(tables,page_width,page_cnt)
+    tables = tables[page_cnt * page_width:]
+    blocks = unpadNames(tables,block_width,block_cnt)
+    tables = tables[block_cnt * block_width:]
+    groups = []
+    for pos in range(0,group_cnt * group_size,group_size):
+        groups.append((tables[pos:pos + term_width],) +
+            struct.unpack_from(HITS_GROUP,tables,pos + term_width))
+
+    return hits_head(header_size + page_cnt * page_width + block_cnt * block_width +
+        group_cnt * group_size,term_width,pages,blocks,groups)
+
+""" (page, term, x0, y0, x1, y1, conf, bident) for every posting in a group """
+def groupHits(head,data,term_cnt):
+    row_size = head.term_width + struct.calcsize(HITS_TERM)
+    posting_size = struct.calcsize(HITS_POSTING)
+    for pos in range(0,term_cnt * row_size,row_size):
+        term = data[pos:pos + head.term_width].rstrip(b'\0').decode()
+        first, cnt = struct.unpack_from(HITS_TERM,data,pos + head.term_width)
+        start = term_cnt * row_size + first * posting_size
+        for pnum, bnum, x0, y0, x1, y1, conf in struct.iter_unpack(HITS_POSTING,
+            data[start:start + cnt * posting_size]):
+            yield head.pages[pnum],term,x0,y0,x1,y1,conf,head.blocks[bnum]
+
+""" where word is on the issue's pages, from hits.bin in f at offset; a dict for each
+    hit with its page, block and word box and confidence, in page then word order """
+def findHits(f,word,offset=0,head=None):
+    term = normTerm(word).encode()
+    if head is None:
+        head = readHitsHead(f,offset)
+    if len(term) == 0 or len(term) > head.term_width:
+        return []
+
+    #the term is in the last group starting at or before it
+    key = term.ljust(head.term_width,b'\0')
+    gnum = bisect.bisect_right([group[0] for group in head.groups],key) - 1
+    if gnum < 0:
+        return []
+    first_term, goffset, gsize, term_cnt = head.groups[gnum]
+    f.seek(offset + goffset)
+    data = f.read(gsize)
+
+    row_size = head.term_width + struct.calcsize(HITS_TERM)
+    rows = [data[pos:pos + head.term_width] for pos in range(0,term_cnt * row_size,row_size)]
+    tnum = bisect.bisect_left(rows,key)
+    if tnum == term_cnt or rows[tnum] != key:
+        return []
+    first, cnt = struct.unpack_from(HITS_TERM,data,tnum * row_size + head.term_width)
+    start = term_cnt * row_size + first * struct.calcsize(HITS_POSTING)
+    return [{ "page" : head.pages[pnum], "block" : head.blocks[bnum],
+        "x0" : x0, "y0" : y0, "x1" : x1, "y1" : y1, "conf" : conf }
+        for pnum, bnum, x0, y0, x1, y1, conf in struct.iter_unpack(HITS_POSTING,
+        data[start:start + cnt * struct.calcsize(HITS_POSTING)])]
+
+""" every page's pageHits from hits.bin in f at offset, so an unchanged page
+    does not need its words again """
+def readHits(f,offset=0):
+    head = readHitsHead(f,offset)
+    page_hits = {}
+    for first_term, goffset, gsize, term_cnt in head.groups:
+        f.seek(offset + goffset)
+        for hit in groupHits(head,f.read(gsize),term_cnt):
+            page_hits.setdefault(hit[0],[]).append(hit[1:])
+    return page_hits
+
+if __name__ == "__main__":
+    #hits for each word in an issue's cloud folder, one JSON line per hit
+    issue_folder = sys.argv[1].rstrip('/')
+    with open(issue_folder + "/odw.json") as f:
+        offsets = json.load(f)
+    with open(issue_folder + "/odw.zip","rb") as f:
+        head = readHitsHead(f,offsets["hits_offset"])
+        for word in sys.argv[2:]:
+            for hit in findHits(f,word,offsets["hits_offset"],head):
+                print(json.dumps(dict(hit,term=normTerm(word))))
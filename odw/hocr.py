@@ -0,0 +1,449 @@
+"""
+hocr.py - read HOCR into word columns and write the cleaned _odw.hocr
+"""
+
+import xml.etree.ElementTree as ET
+import numpy as np
+
+from .consts import HOCR_NS, HOCR_INDENT
+
+""" par_region - a paragraph on the image """
+class par_region:
+    def __init__(self, cnt, x0, y0, x1, y1, bident):
+        self.cnt = cnt
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.bident = bident
+
+""" word_table - word hocr info, one column per field """
+class word_table:
+    def __init__(self, x0, y0, x1, y1, wconf, wtext, wline, pident, dident,
+        lines, pars, divs, dropped=0):
+        self.x0 = x0 # coords and conf are numpy int32 arrays
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.wconf = wconf
+        self.wtext = wtext # list of word strings
+        self.wline = wline # ids into lines/pars/divs
+        self.pident = pident
+        self.dident = dident
+        self.lines = lines
+        self.pars = pars
+        self.divs = divs
+        self.dropped = dropped # words left out by the confidence cut
+
+    def __len__(self):
+        return len(self.wtext)
+
+""" word_cols - word columns gathered while parsing, before any filtering """
+class word_cols:
+    def __init__(self):
+        self.coords = []
+        self.wconf = []
+        self.wtext = []
+        self.wline = []
+        self.pident = []
+        self.dident = []
+        self.lines = {} # interned values, value -> id
+        self.pars = {}
+        self.divs = {}
+
+""" hocr_writer - HOCR output for a page, written as each block is finished """
+class hocr_writer:
+    def __init__(self, out, page_node):
+        self.out = out # text stream, a file or a zip entry
+        self.page_node = page_node # ocr_page, without its blocks
+        self.started = False # page start tag written
+
+""" pull coords and sometimes conf from bbox string """
+def getBBoxInfo(bbox_str):
+    conf = None
+
+    if ';' in bbox_str:
+        bbox_info = bbox_str.split(';')
+        bbox_info = bbox_info[1].strip()
+        bbox_info = bbox_info.split(' ')
+        conf = int(bbox_info[1])
+    bbox_info = bbox_str.replace(';',' ')
+    bbox_info = bbox_info.split(' ')
+    x0 = int(bbox_info[1])
+    y0 = int(bbox_info[2])
+    x1 = int(bbox_info[3])
+    y1 = int(bbox_info[4])
+
+    return x0,y0,x1,y1,conf
+
+""" look for limits of coord boxes """
+def calcBoxLimit(low_x, low_y, high_x, high_y, x0, y0, x1, y1):
+                
+    if low_x == 0 or x0 < low_x:
+        low_x = x0
+    if low_y == 0 or y0 < low_y:
+        low_y = y0
+    if high_x == 0 or x1 > high_x:
+        high_x = x1
+    if high_y == 0 or y1 > high_y:
+        high_y = y1
+
+    return low_x, low_y, high_x, high_y
+
+""" qualified name for a tag, as ET.tostring writes it """
+def hocrTag(tag):
+    if isinstance(tag,ET.QName):
+        tag = tag.text
+    if tag.startswith("{" + HOCR_NS + "}"):
+        return "html:" + tag[len(HOCR_NS) + 2:]
+    return tag
+
+""" escape text or an attribute value, as minidom writes it """
+def hocrEscape(data):
+    return data.replace("&", "&amp;").replace("<", "&lt;"). \
+        replace("\"", "&quot;").replace(">", "&gt;")
+
+""" start tag with its attributes """
+def hocrStartTag(node):
+    return "<" + hocrTag(node.tag) + "".join(' %s="%s"' % (name,hocrEscape(val))
+        for name, val in node.attrib.items())
+
+""" write node and its children with the layout of minidom's toprettyxml """
+def writeHocrNode(out,node,indent):
+    children = []
+    if node.text:
+        children.append(node.text)
+    for child in node:
+        children.append(child)
+        if child.tail:
+            children.append(child.tail)
+
+    out.write(indent + hocrStartTag(node))
+    if len(children) == 0:
+        out.write("/>\n")
+        return
+    if len(children) == 1 and isinstance(children[0],str):
+        out.write(">" + hocrText(children[0]) + "</" + hocrTag(node.tag) + ">\n")
+        return
+    out.write(">\n")
+    for child in children:
+        if isinstance(child,str):
+            out.write(indent + HOCR_INDENT + hocrText(child) + "\n")
+        else:
+            writeHocrNode(out,child,indent + HOCR_INDENT)
+    out.write(indent + "</" + hocrTag(node.tag) + ">\n")
+
+""" text content, line ends as an XML parser would leave them """
+def hocrText(data):
+    return hocrEscape(data.replace("\r\n","\n").replace("\r","\n"))
+
+""" start HOCR output with headers, the page itself goes out a block at a time """
+def openHocrWriter(out,result_title,page_node):
+    hwriter = hocr_writer(out,page_node)
+    out.write('<?xml version="1.0" ?>\n')
+    out.write('<html:html xmlns:html="%s">\n' % HOCR_NS)
+    writeHocrNode(out,addHtmlHeaders(result_title)[0],HOCR_INDENT)
+    out.write(HOCR_INDENT + "<html:body>\n")
+    return hwriter
+
+""" write a finished ocr_carea block, nothing keeps hold of it afterwards """
+def addHocrBlock(hwriter,block):
+    indent = HOCR_INDENT * 2
+    if not hwriter.started:
+        hwriter.out.write(indent + hocrStartTag(hwriter.page_node) + ">\n")
+        if hwriter.page_node.text:
+            hwriter.out.write(indent + HOCR_INDENT + hocrText(hwriter.page_node.text) + "\n")
+        hwriter.started = True
+    writeHocrNode(hwriter.out,block,indent + HOCR_INDENT)
+    if block.tail:
+        hwriter.out.write(indent + HOCR_INDENT + hocrText(block.tail) + "\n")
+
+""" close out the page and headers """
+def closeHocrWriter(hwriter):
+    indent = HOCR_INDENT * 2
+    if hwriter.started:
+        hwriter.out.write(indent + "</" + hocrTag(hwriter.page_node.tag) + ">\n")
+    else:
+        writeHocrNode(hwriter.out,hwriter.page_node,indent)
+    if hwriter.page_node.tail:
+        hwriter.out.write(indent + hocrText(hwriter.page_node.tail) + "\n")
+    hwriter.out.write(HOCR_INDENT + "</html:body>\n</html:html>\n")
+
+""" add headers for HOCR """
+def addHtmlHeaders(result_title):
+    html_node = ET.Element(ET.QName(HOCR_NS,"html"))
+    head_element = ET.Element(ET.QName(HOCR_NS,"head"))
+    title_element = ET.Element(ET.QName(HOCR_NS,"title"))
+    title_element.text = result_title
+    head_element.append(title_element)
+    html_node.append(head_element)
+
+    return html_node
+
+""" recreate hocr structure based on words """
+def runThruWords(file_base,words,orig_node,conf,lang,result_title):
+    #hocr numbering starts at 1 (not 0), for each page
+    block_cnt = 1
+    par_cnt = 1
+    line_cnt = 1
+    word_cnt = 1
+
+    par_regions = []
+    par_word_cnt = 0
+
+    #blocks are written out as they are finished, the page is never held whole
+    hwriter = None
+    if len(words) > 0:
+        hwriter = openHocrWriter(open(file_base + '_odw.hocr','w'),
+            result_title,orig_node)
+
+    l_low_x = 0
+    l_low_y = 0
+    l_high_x = 0
+    l_high_y = 0
+
+    p_low_x = 0
+    p_low_y = 0
+    p_high_x = 0
+    p_high_y = 0
+
+    div_element = ET.Element(ET.QName(HOCR_NS,"div"))
+    div_element.set('class','ocr_carea')
+    div_element.set('id','block_1_%d' % block_cnt)
+
+    p_element = ET.Element(ET.QName(HOCR_NS,"p"))
+    p_element.set('class','ocr_par')
+    p_element.set('lang',lang)
+    p_element.set('id','par_1_%d' % par_cnt)
+
+    wline = ''
+    wpar = ''
+    wdiv = ''
+    l_element = None
+
+    num_words = len(words) - 1
+    par_filled = False
+    div_filled = False
+
+    #plain lists are quicker to step through than numpy scalars
+    wx0 = words.x0.tolist()
+    wy0 = words.y0.tolist()
+    wx1 = words.x1.tolist()
+    wy1 = words.y1.tolist()
+    wconf = words.wconf.tolist()
+    wlines = words.wline.tolist()
+    wpars = words.pident.tolist()
+    wdivs = words.dident.tolist()
+
+    #words in paras
+    for cnt, wtext in enumerate(words.wtext):
+        x0 = wx0[cnt]
+        y0 = wy0[cnt]
+        x1 = wx1[cnt]
+        y1 = wy1[cnt]
+        region_line = words.lines[wlines[cnt]]
+        region_par = words.pars[wpars[cnt]]
+        region_div = words.divs[wdivs[cnt]]
+
+        w_element = ET.Element(ET.QName(HOCR_NS,"span"))
+        w_element.set('class','ocrx_word')
+
+        w_element.text = wtext
+        w_element.set('title','bbox %d %d %d %d; x_wconf %d' %
+            (x0,y0,x1,y1,wconf[cnt]))
+        w_element.set('id','word_1_%d' % word_cnt)
+        word_cnt += 1
+        par_word_cnt += 1
+
+        if wline != region_line:
+            if l_element is not None:
+                l_element.set('title','bbox %d %d %d %d; %s' %
+                    (l_low_x,l_low_y,l_high_x,l_high_y,wline))
+                l_element.set('id','line_1_%d' % line_cnt)
+                line_cnt += 1
+                p_element.append(l_element)
+                par_filled = True
+
+            l_element = ET.Element(ET.QName(HOCR_NS,"span"))
+            l_element.set('class','ocr_line')
+            l_low_x = 0
+            l_low_y = 0
+            l_high_x = 0
+            l_high_y = 0
+
+        l_low_x, l_low_y, l_high_x, l_high_y = calcBoxLimit(
+            l_low_x, l_low_y, l_high_x, l_high_y, x0, y0, x1, y1)
+
+        if l_element is not None:
+            l_element.append(w_element)
+            wline = region_line
+
+            if (wpar != region_par or cnt == num_words) and len(wpar) > 0:
+                p_element.set('title','bbox %d %d %d %d' %
+                    (p_low_x, p_low_y, p_high_x, p_high_y))
+                p_element.set('id','par_1_%d' % par_cnt)
+                par_regions.append(par_region(par_word_cnt,p_low_x, p_low_y, p_high_x, p_high_y,""))
+                par_word_cnt = 0
+                par_cnt += 1
+                if cnt == num_words:
+                    if (l_low_x + l_low_y + l_high_x + l_high_y) > 0:
+                        l_element.set('title','bbox %d %d %d %d; %s' %
+                            (l_low_x,l_low_y,l_high_x,l_high_y,wline))
+                        l_element.set('id','line_1_%d' % line_cnt)
+                    p_element.append(l_element)
+                    par_filled = True
+                
+                if par_filled:
+                    div_element.append(p_element)
+                    par_filled = False
+                    div_filled = True
+     
+                if cnt != num_words and not par_filled: 
+                    p_element = ET.Element(ET.QName(HOCR_NS,"p"))
+                    p_element.set('class','ocr_par')
+                    p_element.set('lang',lang)
+                    p_low_x = 0
+                    p_low_y = 0
+                    p_high_x = 0
+                    p_high_y = 0
+
+            p_low_x, p_low_y, p_high_x, p_high_y = calcBoxLimit(
+                p_low_x, p_low_y, p_high_x, p_high_y, x0, y0, x1, y1)
+
+            if (wdiv != region_div or cnt == num_words) and len(wdiv) > 0:
+                div_element.set('id','block_1_%d' % block_cnt)
+                block_cnt += 1
+                if div_filled:
+                    addHocrBlock(hwriter,div_element)
+                    div_filled = False
+                    if cnt != num_words:
+                        div_element = ET.Element(ET.QName(HOCR_NS,"div"))
+                        div_element.set('class','ocr_carea')
+
+            wpar = region_par
+            wdiv = region_div
+
+    if hwriter is not None:
+        closeHocrWriter(hwriter)
+        hwriter.out.close()
+        #convenience code, this would be one way to get a text version of the results
+        """
+        if os.path.exists(file_base + '_odw.hocr'):
+             cmd_line = "%s %s | %s -stdin --dump > %s_odw.txt" % (CAT_CMD,file_base + '.txt',LYNX_CMD,img_base)
+             print("cmd: ", cmd_line)
+             call(cmd_line, shell=True)
+        """
+    return par_regions
+
+""" check for any numbers in string """
+def hasNumbers(inputString):
+    return any(char.isdigit() for char in inputString)
+
+""" map value to a small int id, reusing the id for repeats """
+def internVal(ivals,val):
+    ival = ivals.get(val)
+    if ival is None:
+        ival = len(ivals)
+        ivals[val] = ival
+    return ival
+
+""" keep words over the confidence threshold (or with numbers) as a word_table """
+def filterWords(cols,HOCRconf,number):
+    coords = np.array(cols.coords,dtype=np.int32).reshape(-1,4)
+    wconf = np.array(cols.wconf,dtype=np.int32)
+    wline = np.array(cols.wline,dtype=np.int32)
+    pident = np.array(cols.pident,dtype=np.int32)
+    dident = np.array(cols.dident,dtype=np.int32)
+
+    keep = wconf >= HOCRconf
+    if number:
+        keep |= np.fromiter((hasNumbers(wtext) for wtext in cols.wtext),
+            dtype=bool,count=len(cols.wtext))
+    kept = np.flatnonzero(keep)
+
+    return word_table(coords[kept,0],coords[kept,1],coords[kept,2],coords[kept,3],
+        wconf[kept],[cols.wtext[i] for i in kept.tolist()],
+        wline[kept],pident[kept],dident[kept],
+        list(cols.lines),list(cols.pars),list(cols.divs),
+        len(cols.wtext) - len(kept))
+
+""" pull together paragraphs from hocr file """
+def sortOutHocr(ifile,words):
+    div_tag = '{%s}%s' % (HOCR_NS,'div')
+    par_tag = '{%s}%s' % (HOCR_NS,'p')
+    span_tag = '{%s}%s' % (HOCR_NS,'span')
+
+    page_node = None # last ocr_page seen, kept without its children
+    page_elem = None # ocr_page currently being read
+    par_elem = None
+    line_info = None
+    wordstext = ''
+    elems = [] # open elements, parent is always elems[-1]
+
+    #single pass, words are kept and children of ocr_page are
+    #dropped as soon as they close so the tree never fills up
+    for event, elem in ET.iterparse(ifile, events=('start','end')):
+        if event == 'start':
+            if elem.tag == div_tag and elem.get('class') == 'ocr_page':
+                page_node = elem
+                page_elem = elem
+            elif page_elem is not None and elem.tag == par_tag and \
+                elem.get('class') == 'ocr_par':
+                par_elem = elem
+                line_info = None
+                wordstext = ''
+            elif par_elem is not None and elem.tag == span_tag:
+                class_name = elem.attrib['class']
+                if class_name in 'ocr_line,ocr_caption,ocr_header,ocr_textfloat': 
+                    #save line infos
+                    line_info = elem.attrib['title']
+                    line_index = line_info.find(';')
+                    line_info = line_info[line_index + 1:]
+                    line_info = ' '.join(line_info.split())
+            elems.append(elem)
+            continue
+
+        elems.pop()
+        if elem is page_elem:
+            page_elem = None
+        elif elem is par_elem:
+            #skip para blocks that don't have any text
+            if len(wordstext.strip()) > 0:
+                print(".",end="",flush=True)
+            par_elem = None
+        elif par_elem is not None and elem.tag == span_tag and \
+            elem.attrib['class'] == 'ocrx_word' and elem.text is not None: #word details
+            word_text = elem.text.strip()
+            if len(word_text) > 0:
+                x0,y0,x1,y1,conf = getBBoxInfo(elem.attrib['title'])
+                words.coords.extend((x0,y0,x1,y1))
+                words.wconf.append(conf)
+                words.wtext.append(word_text)
+                words.wline.append(internVal(words.lines,line_info))
+                words.pident.append(internVal(words.pars,par_elem.attrib['id']))
+                words.dident.append(internVal(words.divs,page_node.attrib['id']))
+            wordstext += word_text
+
+        if page_elem is not None and elems[-1] is page_elem:
+            page_elem.remove(elem)
+
+    return words, page_node
+
+""" words and page node of a hocr file, no words (and no page) if it won't parse """
+def readHocr(ifile):
+    print("sort through hocr words for " + ifile + " ...",end="",flush=True)
+    try:
+        cols, page_node = sortOutHocr(ifile,word_cols())
+    except ET.ParseError:
+        cols = word_cols()
+        page_node = None
+    print("!") #hocr processing is done
+
+    return cols, page_node
+
+""" write results to file """
+def writeHocr(block,fhocr):
+
+    hfile = open(fhocr, "w+b")
+    hfile.write(bytearray(block))
+    hfile.close()
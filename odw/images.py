@@ -0,0 +1,448 @@
+"""
+images.py - page images, the cropped blocks and the IIIF tiles
+
+Pillow (and pyvips, if installed) are only loaded once a page image is needed.
+"""
+
+import functools, io, json, math, os, threading, zipfile
+from pathlib import Path
+
+from .consts import MARGIN, TILE_SIZE, VIPS_ID, FULL_TILES, THUMB_GAP
+from .hocr import par_region
+from .terms import par_index, addParRegion, findParRegion
+from .zips import zip_writer, addZipEntry, addZipImage, closeZipWriter
+
+""" pyvips if it is installed and libvips loads, else None (looked for once) """
+@functools.lru_cache(maxsize=None)
+def getVips():
+    try:
+        import pyvips # optional, quicker tile pyramids when libvips is around
+    except (ImportError, OSError):
+        return None
+    return pyvips
+
+""" pixel_budget - decoded bytes the pages of a process may hold at once, with --memory """
+class pixel_budget:
+    def __init__(self, cap):
+        self.cap = cap
+        self.used = 0
+        self.cond = threading.Condition() # pages decode in several threads with -p
+
+""" page_image - page image, decoded at most once and shared by each stage """
+class page_image:
+    def __init__(self, ifile, budget=None):
+        self.ifile = ifile
+        self.img = None # pixels, only once a stage asks for them
+        self.size = None
+        self.mode = None
+        self.budget = budget # pixel_budget shared with the other pages, if any
+        self.held = 0 # bytes of budget taken for img
+
+""" wait until nbytes fit in budget, something bigger than the whole
+    cap goes ahead once nothing else is held """
+def takeBudget(budget,nbytes):
+    if budget is None:
+        return
+    with budget.cond:
+        budget.cond.wait_for(lambda: budget.used == 0 or budget.used + nbytes <= budget.cap)
+        budget.used += nbytes
+
+""" hand nbytes back to budget """
+def giveBudget(budget,nbytes):
+    if budget is None:
+        return
+    with budget.cond:
+        budget.used -= nbytes
+        budget.cond.notify_all()
+
+""" bytes Pillow needs for w x h pixels, multi-band pixels are held in 4 bytes """
+def pixelBytes(mode,w,h):
+    return w * h * (1 if mode in ('1','L','P','I;16') else 4)
+
+""" decoded pixels for page, shared by blocks and tiles """
+def getPageImage(pimg):
+    from PIL import Image
+    if pimg.img is None:
+        if pimg.budget is not None:
+            pimg.held = pageBytes(pimg)
+            takeBudget(pimg.budget,pimg.held)
+        pimg.img = Image.open(pimg.ifile)
+        pimg.img.load()
+        pimg.size = pimg.img.size
+    return pimg.img
+
+""" page dims and mode from the image header """
+def readPageHeader(pimg):
+    from PIL import Image
+    with Image.open(pimg.ifile) as img:
+        pimg.size = img.size
+        pimg.mode = img.mode
+
+""" page dims, only the image header is read if nothing is decoded yet """
+def getPageSize(pimg):
+    if pimg.size is None:
+        readPageHeader(pimg)
+    return pimg.size
+
+""" bytes the page takes once decoded """
+def pageBytes(pimg):
+    if pimg.mode is None:
+        readPageHeader(pimg)
+    return pixelBytes(pimg.mode,pimg.size[0],pimg.size[1])
+
+""" pixels in box, which can run off the page as with crop(); a page too
+    big for the --memory budget is read a region at a time where it can be """
+def getPageRegion(pimg,box):
+    if pimg.img is None and pimg.budget is not None:
+        if pageBytes(pimg) > pimg.budget.cap:
+            region = readRegion(pimg,box)
+            if region is not None:
+                return region
+    return getPageImage(pimg).crop(box)
+
+""" read just the strips or tiles of a TIFF under box, with libvips if it is
+    around (any compression), otherwise for uncompressed TIFFs only; None if
+    the page has to be decoded whole (JPEG, or modes other than L and RGB).
+    Without libvips this leans on Pillow internals (the image's _size and
+    tile list), and if those do not behave it gives None as well """
+def readRegion(pimg,box):
+    from PIL import Image
+    x0,y0,x1,y1 = box
+    w,h = getPageSize(pimg)
+    #only the part on the page is read, crop() pads the rest with black
+    cx0, cy0, cx1, cy1 = max(x0,0), max(y0,0), min(x1,w), min(y1,h)
+    if cx0 >= cx1 or cy0 >= cy1:
+        return Image.new(pimg.mode,(x1 - x0,y1 - y0))
+
+    with Image.open(pimg.ifile) as img:
+        if img.format != 'TIFF' or img.mode not in ('L','RGB'):
+            return None
+        pyvips = getVips()
+        if pyvips is not None:
+            nbytes = pixelBytes(img.mode,cx1 - cx0,cy1 - cy0)
+            takeBudget(pimg.budget,nbytes)
+            try:
+                vips_img = pyvips.Image.new_from_file(pimg.ifile,access='random')
+                region = Image.frombytes(img.mode,(cx1 - cx0,cy1 - cy0),
+                    vips_img.crop(cx0,cy0,cx1 - cx0,cy1 - cy0).write_to_memory())
+            finally:
+                giveBudget(pimg.budget,nbytes)
+            if (cx0, cy0, cx1, cy1) == (x0, y0, x1, y1):
+                return region
+            page_region = Image.new(img.mode,(x1 - x0,y1 - y0))
+            page_region.paste(region,(cx0 - x0,cy0 - y0))
+            return page_region
+
+        #strips or tiles Pillow decodes itself, libtiff ones are read whole
+        tiles = [tile for tile in img.tile if tile[1][0] < cx1 and tile[1][2] > cx0 and
+            tile[1][1] < cy1 and tile[1][3] > cy0]
+        if len(tiles) == 0 or any(tile[0] != 'raw' for tile in img.tile):
+            return None
+        bx0 = min(tile[1][0] for tile in tiles)
+        by0 = min(tile[1][1] for tile in tiles)
+        bx1 = max(tile[1][2] for tile in tiles)
+        by1 = max(tile[1][3] for tile in tiles)
+
+        #decode into an image the size of the tiles that were kept, tiles are
+        #plain tuples as older Pillow has no ImageFile._Tile
+        nbytes = pixelBytes(img.mode,bx1 - bx0,by1 - by0)
+        takeBudget(pimg.budget,nbytes)
+        try:
+            img._size = (bx1 - bx0,by1 - by0)
+            img.tile = [(tile[0],(tile[1][0] - bx0,tile[1][1] - by0,tile[1][2] - bx0,
+                tile[1][3] - by0),tile[2],tile[3]) for tile in tiles]
+            img.load()
+            return img.crop((x0 - bx0,y0 - by0,x1 - bx0,y1 - by0))
+        except (AttributeError, TypeError, ValueError, OSError): # Pillow internals changed
+            return None
+        finally:
+            giveBudget(pimg.budget,nbytes)
+
+""" pixels at least width wide, a JPEG not decoded yet is read at a reduced DCT scale;
+    the draft is charged to the page's budget until releasePageDraft """
+def getPageDraft(pimg,width):
+    from PIL import Image
+    if pimg.img is not None:
+        return pimg.img
+
+    img = Image.open(pimg.ifile)
+    if img.format != 'JPEG':
+        img.close()
+        return getPageImage(pimg)
+
+    pimg.size = img.size
+    w,h = img.size
+    img.draft(img.mode,(width,math.ceil(width * h / w)))
+    nbytes = pixelBytes(img.mode,img.width,img.height) # the reduced size once drafted
+    takeBudget(pimg.budget,nbytes)
+    try:
+        img.load()
+    except BaseException:
+        img.close()
+        giveBudget(pimg.budget,nbytes)
+        raise
+    return img
+
+""" close a draft from getPageDraft and hand back its budget, the page's own
+    pixels are left for releasePageImage """
+def releasePageDraft(pimg,img):
+    if img is not pimg.img:
+        nbytes = pixelBytes(img.mode,img.width,img.height)
+        img.close()
+        giveBudget(pimg.budget,nbytes)
+
+""" let go of decoded pixels once page is finished (size is kept) """
+def releasePageImage(pimg):
+    if pimg.img is not None:
+        pimg.img.close()
+        pimg.img = None
+    giveBudget(pimg.budget,pimg.held)
+    pimg.held = 0
+
+""" parse min(imum) values from input string """
+def getBlockMins(bmin):
+    b_width = 0
+    b_height = 0
+    b_words = 0
+
+    if "x" in bmin:
+        b_parts = bmin.split('x')
+        b_width = int(b_parts[0])
+        b_height = int(b_parts[1])
+        b_words = int(b_parts[2])
+
+    return b_width, b_height, b_words
+
+""" calculate area """
+def getArea(r):
+    w = abs(r.x1 - r.x0)
+    h = abs(r.y1 - r.y0)
+
+    return (w * h)
+
+""" determine minimum block for snippet """
+def calcBlock(region,bw,bh):
+
+    #start new region
+    x0 = region.x0 - MARGIN
+    y0 = region.y0 - MARGIN
+    x1 = region.x1 + MARGIN
+    y1 = region.y1 + MARGIN
+
+    if (x1 - x0) < bw:
+         #calc missing width
+         w = bw - (x1 - x0)
+         x0 = round(x0 - (w/2))
+         x1 = round(x1 + (w/2))
+         if x0 < 0:
+             x1 -= x0
+             x0 = 0
+
+    if (y1 - y0) < bh:
+         #calc missing height
+         h = bh - (y1 - y0)
+         y0 = round(y0 - (h/2))
+         y1 = round(y1 + (h/2))
+         if y0 < 0:
+             y1 -= y0
+             y0 = 0
+               
+    return x0, y0, x1, y1
+
+""" deal with image blocks """
+def runThruBlocks(ibase,pimg,odir,pars,dflag,bmin):
+    print("create image blocks for " + pimg.ifile + " ...",end="",flush=True)
+    sm_blocks = []
+    ok_blocks = []
+    bw, bh, bws = getBlockMins(bmin)
+    img_folder = odir + "/cloud/" + ibase
+
+    if not os.path.exists(img_folder):
+        Path(img_folder).mkdir(parents=True, exist_ok=True)
+
+    #crops are encoded in memory and go straight into the zip
+    zwriter = zip_writer(img_folder + "/blocks.zip",'blocks')
+
+    for region in pars:
+        x0 = region.x0 - MARGIN
+        y0 = region.y0 - MARGIN
+        x1 = region.x1 + MARGIN
+        y1 = region.y1 + MARGIN
+
+        if x1 > 0 and y1 > 0 and (x1 - x0) > bw and (y1 - y0) > bh and region.cnt >= bws:
+            #extract region
+            pg_box = (x0,y0,x1,y1)
+            roi_rect = getPageRegion(pimg,pg_box)
+            bident = "%08d_%08d_%08d_%08d_%05d" % (x0,y0,x1,y1,region.cnt)
+            addZipImage(zwriter,"blocks/%s.jpg" % bident,roi_rect)
+            #roi_rect.save("%s/%s.jpg" % ("/tmp/btest0",bident))
+            region.bident = bident
+            ok_blocks.append(region)
+            print(".",end="",flush=True)
+        else:
+            sm_blocks.append(region)
+
+    #sort by area, smaller regions that fall inside a block
+    #already cut from a bigger one are left out
+    sm_blocks.sort(key=getArea,reverse=True)
+    bindex = par_index([])
+    for region in sm_blocks:
+        if findParRegion(bindex,region.x0,region.y0,region.x1,region.y1) is None:
+            x0, y0, x1, y1 = calcBlock(region,bw,bh)
+            bident = "%08d_%08d_%08d_%08d_%05d" % (x0,y0,x1,y1,region.cnt)
+            addParRegion(bindex,par_region(region.cnt,x0,y0,x1,y1,bident))
+            pg_box = (x0,y0,x1,y1)
+            roi_rect = getPageRegion(pimg,pg_box)
+            addZipImage(zwriter,"blocks/%s.jpg" % bident,roi_rect)
+            #roi_rect.save("%s/%s.jpg" % ("/tmp/btest1",bident))
+            region.bident = bident
+            ok_blocks.append(region)
+            print(".",end="",flush=True)
+
+    print("!")
+    zip_dir = closeZipWriter(zwriter,ibase,odir + "/cache/" + ibase,
+        odir + "/cache/" + ibase + "/bdir.bin",dflag)
+
+    return zip_dir, ok_blocks
+
+""" IIIF info.json, laid out the way vips dzsave writes it """
+def iiifInfo(vips_id,tile_base,width,height,num_levels):
+    json_obj = {
+        "@context": "http://iiif.io/api/image/2/context.json",
+        "@id": vips_id + "/" + tile_base,
+        "profile": [
+            "http://iiif.io/api/image/2/level0.json",
+            {
+                "formats": [ "jpg" ],
+                "qualities": [ "default" ]
+            }
+        ],
+        "protocol": "http://iiif.io/api/image",
+        "tiles": [
+            {
+                "scaleFactors": [2 ** level for level in range(num_levels)],
+                "width": TILE_SIZE
+            }
+        ],
+        "width": width,
+        "height": height
+    }
+
+    return json.dumps(json_obj, indent=2) + "\n"
+
+""" cut IIIF tile pyramid (vips --layout iiif naming) into zip """
+def addIiifTiles(zwriter,img,tile_base,vips_id):
+    if img.mode not in ('L','RGB'):
+        img = img.convert('RGB')
+    width, height = img.size
+    level_img = img
+    scale = 1
+    num_levels = 1
+
+    #halve each level until it fits in one tile, the
+    #last level goes under full/ like vips does it
+    while level_img.width > TILE_SIZE or level_img.height > TILE_SIZE:
+        for ty in range(0,level_img.height,TILE_SIZE):
+            for tx in range(0,level_img.width,TILE_SIZE):
+                tw = min(TILE_SIZE,level_img.width - tx)
+                th = min(TILE_SIZE,level_img.height - ty)
+                #region is given in full size coords
+                region = "%d,%d,%d,%d" % (tx * scale,ty * scale,
+                    min(TILE_SIZE * scale,width - tx * scale),
+                    min(TILE_SIZE * scale,height - ty * scale))
+                addZipImage(zwriter,"%s/%s/%d,/0/default.jpg" % (tile_base,region,tw),
+                    level_img.crop((tx,ty,tx + tw,ty + th)))
+        level_img = level_img.reduce(2)
+        scale *= 2
+        num_levels += 1
+    addZipImage(zwriter,"%s/full/%d,/0/default.jpg" % (tile_base,level_img.width),
+        level_img)
+
+    addZipEntry(zwriter,tile_base + "/info.json",
+        iiifInfo(vips_id,tile_base,width,height,num_levels).encode())
+
+""" hand pyramid over to libvips and copy its tiles into zip """
+def addVipsTiles(zwriter,pimg,tile_base,vips_id):
+    pyvips = getVips()
+    if pimg.img is None:
+        vips_img = pyvips.Image.new_from_file(pimg.ifile,access='sequential')
+    else:
+        #reuse the pixels already decoded rather than have vips decode again
+        img = pimg.img
+        if img.mode not in ('L','RGB'):
+            img = img.convert('RGB')
+        vips_img = pyvips.Image.new_from_memory(img.tobytes(),img.width,img.height,
+            len(img.getbands()),'uchar')
+    vips_buffer = vips_img.dzsave_buffer(basename=tile_base,layout='iiif',
+        tile_size=TILE_SIZE,id=vips_id)
+
+    with zipfile.ZipFile(io.BytesIO(vips_buffer)) as vips_zip:
+        for zinfo in vips_zip.infolist():
+            #vips-properties.xml is left out
+            if zinfo.filename.startswith(tile_base + '/'):
+                addZipEntry(zwriter,zinfo.filename,vips_zip.read(zinfo))
+
+""" thumbnail dims for width tsize, rounded the way PIL thumbnail() does """
+def thumbSize(w,h,tsize):
+    if tsize >= w:
+        return w,h
+
+    aspect = w / h
+    th = tsize / aspect
+    th = max(min(math.floor(th),math.ceil(th),
+        key=lambda n: 0 if n == 0 else abs(aspect - tsize / n)),1)
+    return tsize,th
+
+""" full/<w>,/0 derivatives, largest first, each resampled from the smallest
+    one already made that is still gap times wider (or from the page) """
+def addFullTiles(zwriter,pimg,tile_base,gap=THUMB_GAP):
+    from PIL import Image
+    w,h = getPageSize(pimg)
+    sizes = sorted(FULL_TILES,reverse=True)
+    draft_img = getPageDraft(pimg,min(w,math.ceil(sizes[0] * gap)))
+    try:
+        page_img = draft_img
+        if page_img.mode not in ('L','RGB'):
+            page_img = page_img.convert('RGB')
+
+        tb_imgs = {}
+        for tsize in sizes:
+            tw, th = thumbSize(w,h,tsize)
+            src_img = page_img
+            for tb_img in tb_imgs.values():
+                if tb_img.width >= tw * gap and tb_img.width < src_img.width:
+                    src_img = tb_img
+            tb_imgs[tsize] = src_img.resize((tw,th),Image.Resampling.LANCZOS,
+                reducing_gap=gap)
+    finally:
+        releasePageDraft(pimg,draft_img)
+
+    for tsize in FULL_TILES:
+        addZipImage(zwriter,"%s/full/%d,/0/default.jpg" % (tile_base,tsize),
+            tb_imgs[tsize])
+
+""" carry out tile work """
+def runThruTiles(ibase,pimg,odir,dflag):
+    zip_cloud_loc = odir + "/cloud/" + ibase
+    zip_cache_loc = odir + "/cache/" + ibase
+    zip_file = zip_cloud_loc + "/tiles.zip"
+    dir_file = zip_cache_loc + "/tdir.bin"
+
+    print("create image tiles " + pimg.ifile + " ...",end="",flush=True)
+    if not os.path.exists(odir):
+        os.mkdir(odir)
+
+    img_folder = odir + "/cloud/" + ibase
+    if not os.path.exists(img_folder):
+        Path(img_folder).mkdir(parents=True, exist_ok=True)
+
+    #tiles and full size derivatives go into the zip in one pass
+    zwriter = zip_writer(zip_file,'tiles')
+    if getVips() is not None:
+        addVipsTiles(zwriter,pimg,'tiles',VIPS_ID + ibase)
+    else:
+        addIiifTiles(zwriter,getPageImage(pimg),'tiles',VIPS_ID + ibase)
+    addFullTiles(zwriter,pimg,'tiles')
+    print("!")
+
+    return closeZipWriter(zwriter,ibase,zip_cache_loc,dir_file,dflag)
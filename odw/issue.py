@@ -0,0 +1,273 @@
+"""
+issue.py - run an issue folder through the stages and publish it
+"""
+
+import ctypes, errno, glob, os, shutil, tempfile, traceback, zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .bulk import addBulkLines
+from .consts import AT_FDCWD, RENAME_EXCHANGE
+from .hits import readHits
+from .images import pixel_budget, releasePageImage
+from .ledger import ledgerHash, samePage, readLedger, writeLedger, reusePage
+from .metrics import logStage, newStageLog
+from .pipeline import runThruPipeline
+from .stages import (page_job, parse_stage, filter_stage, rebuild_stage, blocks_stage,
+    tiles_stage, index_stage, hits_stage, package_stage)
+from .zips import zip_info, createZipImages
+
+""" image stages for one page, safe to run alongside other pages """
+def runThruPage(page,page_stages):
+    for stage in page_stages:
+        page = stage.runPage(page)
+    releasePageImage(page.pimg)
+    return page
+
+""" pages through the image stages, in a pool of args.pages threads if asked;
+    pages come back in page order, whatever order they finished in """
+def runThruPages(pages,page_stages,workers):
+    if workers <= 1:
+        for page in pages:
+            yield runThruPage(page,page_stages)
+        return
+
+    #image work can overlap with hocr work on the next page, which is only
+    #read once a thread is nearly free so words are not held for every page
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for page in pages:
+            pending.append(pool.submit(runThruPage,page,page_stages))
+            if len(pending) > workers:
+                yield pending.popleft().result()
+        while len(pending) > 0:
+            yield pending.popleft().result()
+
+""" start of the name of an issue's build folder in the output folder """
+def buildPrefix(ia_folder):
+    return ".odw_" + ia_folder + "."
+
+""" build folders a killed run of the issue left in the output folder, nothing
+    would publish or remove them otherwise """
+def removeStaleBuilds(out,ia_folder):
+    prefix = buildPrefix(ia_folder)
+    for build_folder in glob.glob(out + "/" + glob.escape(prefix) + "*"):
+        #another issue's name can start with this one's, tempfile's part has no dots
+        if '.' not in os.path.basename(build_folder)[len(prefix):]:
+            print("removing stale build folder", build_folder)
+            shutil.rmtree(build_folder,ignore_errors=True)
+
+""" process one issue folder, returns lines for the build script """
+def runThruIssue(folder,args,slog=None):
+    build_lines = []
+    ia_folder = folder.replace('/','_').replace('-','')
+    removeStaleBuilds(args.out,ia_folder)
+
+    #our own *_odw.hocr files from an earlier run are not input
+    hfiles = sorted(hfile for hfile in glob.glob(folder + "/*.hocr")
+        if not hfile.endswith("_odw.hocr"))
+
+    #hash inputs, size and mtime matching the ledger saves reading them again
+    ledger_file = args.out + "/ledger/" + ia_folder + ".json"
+    ledger = readLedger(ledger_file,args)
+    if args.rebuild:
+        ledger["pages"] = {}
+    old_pages = ledger["pages"]
+    new_pages = {}
+    with logStage(slog,"ledger",ia_folder) as counts:
+        for hfile in hfiles:
+            file_base = hfile.rsplit('.', 1)[0]
+            jfile = file_base.rsplit('/',1)[1]
+            old_hash = old_pages.get(jfile,{ "hash" : {} })["hash"]
+            new_pages[jfile] = { "hash" : {
+                "hocr" : ledgerHash(hfile,old_hash.get("hocr")),
+                "image" : ledgerHash(file_base + "." + args.ext,old_hash.get("image")) } }
+        counts.update(pages=len(hfiles))
+
+    #nothing changed, nothing to build
+    if (len(hfiles) > 0 and old_pages.keys() == new_pages.keys() and
+        os.path.exists(args.out + "/cloud/" + ia_folder + "/odw.json") and
+        all(samePage(old_pages[jfile],new_pages[jfile]["hash"]) for jfile in new_pages)):
+        print("skipping unchanged issue", folder)
+        for jfile in new_pages:
+            new_pages[jfile] = dict(old_pages[jfile],hash=new_pages[jfile]["hash"])
+        if new_pages != old_pages: # touched files, keep their new mtimes
+            writeLedger(ledger_file,new_pages,args)
+        return [line for jfile in new_pages for line in new_pages[jfile]["build_lines"]]
+
+    old_zip = None
+    if len(old_pages) > 0 and os.path.exists(args.out + "/cloud/" + ia_folder + "/odw.zip"):
+        old_zip = zipfile.ZipFile(args.out + "/cloud/" + ia_folder + "/odw.zip")
+
+    #and their words by term from the last hits.bin
+    old_hits = None
+    if old_zip is not None and args.hits and "hits.bin" in old_zip.namelist():
+        with old_zip.open("hits.bin") as f:
+            old_hits = readHits(f)
+
+    #build next to the results so publishing is a rename, not a copy
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+    tempd = tempfile.TemporaryDirectory(dir=args.out,prefix=buildPrefix(ia_folder))
+
+    #pages wait for each other's pixels to be let go rather than go over --memory
+    budget = None
+    if args.memory > 0:
+        budget = pixel_budget(args.memory * 1024 * 1024)
+
+    #unchanged pages, their zips and JSON from the last run still hold
+    pages = []
+    for hfile in hfiles:
+        page = page_job(hfile,ia_folder,args.ext,budget)
+        old_page = old_pages.get(page.jfile)
+        if (old_page is not None and samePage(old_page,new_pages[page.jfile]["hash"]) and
+            (old_hits is not None or not args.hits) and
+            reusePage(old_zip,old_page,tempd.name,page.jfile,page.jfile_base,args)):
+            page.reused = True
+            page.zip_dirs = [zip_info(*zname) for zname in old_page["zip_dirs"]]
+            page.build_lines = old_page["build_lines"]
+            if old_hits is not None:
+                page.hits = old_hits.get(page.jfile_base,[])
+            if old_page["size"] is not None:
+                page.pimg.size = tuple(old_page["size"])
+        pages.append(page)
+
+    if old_zip is not None:
+        old_zip.close()
+
+    #with --queue every stage has pages of its own, otherwise pages are
+    #pulled through one at a time, hocr work for the next page can go on
+    #while the image stages have this one
+    if args.queue > 0:
+        pages = runThruPipeline(pages,args,tempd.name,slog)
+    else:
+        pages = parse_stage(args,tempd.name,slog)(pages)
+        pages = filter_stage(args,tempd.name,slog)(pages)
+        pages = rebuild_stage(args,tempd.name,slog)(pages)
+        page_stages = [blocks_stage(args,tempd.name,slog),tiles_stage(args,tempd.name,slog),
+            index_stage(args,tempd.name,slog),hits_stage(args,tempd.name,slog)]
+        pages = runThruPages(pages,page_stages,args.pages)
+    package = package_stage(args,tempd.name,slog)
+
+    for page in package(pages):
+        build_lines += page.build_lines
+        new_pages[page.jfile].update({
+            "zip_dirs" : [[zdir.fname,zdir.offset,zdir.size,zdir.ztype]
+                for zdir in page.zip_dirs],
+            "build_lines" : page.build_lines,
+            "size" : page.pimg.size })
+    package.finish(ia_folder)
+
+    offset_folder = tempd.name + '/cloud/' + ia_folder + '/'
+    zip_img_file = offset_folder + ia_folder + "_images.zip"
+    with logStage(slog,"images",ia_folder) as counts:
+        createZipImages(zip_img_file,folder + "/",folder + "/*" + args.ext)
+        counts.update(bytes=os.path.getsize(zip_img_file))
+
+    pg_folder = tempd.name + '/cloud/' + ia_folder + '/' + folder.replace(args.folder + '/','')
+
+    for pfolder in glob.glob(pg_folder + '*'):
+        shutil.rmtree(pfolder)
+
+    #readers only ever see a finished issue, see publishFolder
+    with logStage(slog,"publish",ia_folder):
+        publishFolder(tempd.name + "/cloud/" + ia_folder,args.out + "/cloud/" + ia_folder)
+        publishFolder(tempd.name + "/cache/" + ia_folder,args.out + "/cache/" + ia_folder)
+
+    # clean up temp folders
+    tempd.cleanup()
+
+    writeLedger(ledger_file,new_pages,args)
+
+    return build_lines
+
+""" swap two folders in one step with renameat2(RENAME_EXCHANGE), False where
+    that can't be done (not linux, an old libc or a filesystem without it) """
+def exchangeFolders(src_folder,dst_folder):
+    try:
+        renameat2 = ctypes.CDLL(None,use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return False
+    renameat2.argtypes = [ctypes.c_int,ctypes.c_char_p,ctypes.c_int,ctypes.c_char_p,
+        ctypes.c_uint]
+    if renameat2(AT_FDCWD,os.fsencode(src_folder),AT_FDCWD,os.fsencode(dst_folder),
+        RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+    raise OSError(err,os.strerror(err),dst_folder)
+
+""" move finished folder into place with a rename, files only found in an
+    earlier copy are hardlinked in first so they are kept (as copy_tree did);
+    the two copies are swapped in one step where the system can, otherwise the
+    old one is moved aside to .old first and put back by the next publish if
+    the new one never got there """
+def publishFolder(src_folder,dst_folder):
+    old_folder = dst_folder + ".old"
+    if os.path.exists(old_folder):
+        if os.path.exists(dst_folder):
+            shutil.rmtree(old_folder)
+        else: # stopped between the two renames last time
+            os.rename(old_folder,dst_folder)
+
+    if not os.path.exists(src_folder):
+        return
+    Path(dst_folder).parent.mkdir(parents=True, exist_ok=True)
+
+    if not os.path.exists(dst_folder):
+        os.rename(src_folder,dst_folder)
+        return
+
+    for root, dirs, files in os.walk(dst_folder):
+        for file in files:
+            dst_file = os.path.join(root, file)
+            src_file = os.path.join(src_folder,os.path.relpath(dst_file,dst_folder))
+            if not os.path.exists(src_file):
+                Path(src_file).parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(dst_file,src_file)
+                except OSError: # no hardlinks on this filesystem
+                    shutil.copy2(dst_file,src_file)
+
+    if exchangeFolders(src_folder,dst_folder):
+        shutil.rmtree(src_folder) # the old copy, now in the build folder
+        return
+
+    os.rename(dst_folder,old_folder)
+    try:
+        os.rename(src_folder,dst_folder)
+    except OSError:
+        os.rename(old_folder,dst_folder) # the last published issue goes back
+        raise
+    shutil.rmtree(old_folder)
+
+""" run an issue with its own stage_log, if any, returns (build lines, stage rows) """
+def runIssue(folder,args):
+    slog = newStageLog(args)
+    with logStage(slog,"issue",folder):
+        build_lines = runThruIssue(folder,args,slog)
+    return build_lines, [] if slog is None else slog.rows
+
+""" run an issue in a worker process, errors are passed back rather than raised """
+def runIssueWorker(folder,args):
+    try:
+        return (folder,) + runIssue(folder,args) + (None,)
+    except Exception:
+        return folder, [], [], traceback.format_exc()
+
+""" what runIssueWorker gave for folder, or a failed issue if its worker process
+    died (killed, out of memory) and took the pool with it """
+def issueResult(folder,future):
+    try:
+        return future.result()
+    except Exception:
+        return folder, [], [], traceback.format_exc()
+
+""" add lines to the build script, or pages' NDJSON to the _bulk files """
+def writeBuildLines(np_code,build_lines,bwriter=None):
+    if bwriter is not None:
+        addBulkLines(bwriter,build_lines)
+    elif len(build_lines) > 0:
+        with open(np_code + ".sh","a") as outfile:
+            outfile.writelines(build_lines)
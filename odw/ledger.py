@@ -0,0 +1,86 @@
+"""
+ledger.py - what went into each page of an issue, so unchanged pages are not built again
+"""
+
+import hashlib, json, os, shutil
+from pathlib import Path
+
+from .images import getVips
+
+""" content hash of a file, read in chunks """
+def hashFile(file_name):
+    fhash = hashlib.sha1()
+    with open(file_name,"rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            fhash.update(chunk)
+    return fhash.hexdigest()
+
+""" [size, mtime, hash] for a file, the ledger hash is reused if size and mtime match """
+def ledgerHash(file_name,old_hash):
+    if not os.path.exists(file_name):
+        return None
+    st = os.stat(file_name)
+    if old_hash is not None and old_hash[:2] == [st.st_size, st.st_mtime_ns]:
+        return old_hash
+    return [st.st_size, st.st_mtime_ns, hashFile(file_name)]
+
+""" options that change what gets built for a page """
+def ledgerOpts(args):
+    opts = { "conf" : args.conf, "number" : args.number, "min" : args.min,
+             "lang" : args.lang, "ext" : args.ext, "title" : args.title,
+             "block" : args.block, "vips" : args.vips, "json" : args.json,
+             "dir" : args.dir, "bulk" : args.bulk > 0,
+             "tiler" : ("vips" if getVips() is not None else "pil") if args.vips else None }
+    if args.terms != "json": # ledgers from before --terms are still good for json
+        opts["terms"] = args.terms
+    if args.hits:
+        opts["hits"] = True
+    return opts
+
+""" hashes for a page's hocr and image, only the content counts """
+def samePage(old_page,page_hash):
+    for key in ("hocr","image"):
+        old_hash = old_page["hash"][key]
+        new_hash = page_hash[key]
+        if (old_hash is None) != (new_hash is None):
+            return False
+        if old_hash is not None and old_hash[2] != new_hash[2]:
+            return False
+    return True
+
+""" ledger for an issue, empty if none or built with other options """
+def readLedger(ledger_file,args):
+    if os.path.exists(ledger_file):
+        with open(ledger_file) as f:
+            ledger = json.load(f)
+        if ledger.get("options") == ledgerOpts(args):
+            return ledger
+    return { "pages" : {} }
+
+""" ledger is written once an issue is published, so a crash leaves the last good one """
+def writeLedger(ledger_file,pages,args):
+    Path(ledger_file).parent.mkdir(parents=True, exist_ok=True)
+    ledger = { "options" : ledgerOpts(args), "pages" : pages }
+    with open(ledger_file + ".tmp","w") as outfile:
+        json.dump(ledger, outfile, indent=4)
+    os.replace(ledger_file + ".tmp",ledger_file)
+
+""" copy an unchanged page's zips out of the published odw.zip, False if any are missing """
+def reusePage(old_zip,old_page,tname,jfile,jfile_base,args):
+    if old_zip is None:
+        return False
+    names = old_zip.namelist()
+    for zname in old_page["zip_dirs"]:
+        if jfile + "/" + zname[3] + ".zip" not in names:
+            return False
+    if len(old_page["build_lines"]) > 0 and not os.path.exists(
+        args.out + "/build/" + jfile_base + (".ndjson" if args.bulk > 0 else ".json")):
+        return False
+
+    for zname in old_page["zip_dirs"]:
+        img_folder = tname + "/cloud/" + jfile_base
+        Path(img_folder).mkdir(parents=True, exist_ok=True)
+        with old_zip.open(jfile + "/" + zname[3] + ".zip") as src, \
+            open(img_folder + "/" + zname[3] + ".zip","wb") as dst:
+            shutil.copyfileobj(src,dst,1 << 20)
+    return True
@@ -0,0 +1,114 @@
+"""
+metrics.py - wall time, cpu time and peak memory for each stage, with --metrics
+"""
+
+import contextlib, cProfile, csv, json, resource, threading, time
+from pathlib import Path
+
+""" stage_log - wall, cpu and peak memory for each stage run, only made with --metrics """
+class stage_log:
+    def __init__(self, profile=None, prof_dir=None, shared=False):
+        self.rows = [] # one dict per stage run
+        self.lock = threading.Lock() # pages can log from several threads
+        self.profile = profile # stage to run under cProfile
+        self.prof_dir = prof_dir
+        self.shared = shared # pages run at once, so a page stage's peak is not its own
+
+""" start peak RSS over, so the next reading is for one stage (linux only) """
+def resetPeakRss():
+    try:
+        with open("/proc/self/clear_refs","w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+""" peak RSS in KB, since the last reset where that works """
+def peakRss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+""" time a stage into slog, the counts dict given to the block is added to its row;
+    with no slog this does nothing. Peak RSS is for the whole process, so for a
+    page stage of a shared slog it is left empty rather than reset under other pages """
+@contextlib.contextmanager
+def logStage(slog,stage,ident,page=False):
+    counts = {}
+    if slog is None:
+        yield counts
+        return
+
+    first = len(slog.rows) # stages run inside this one reset the peak too
+    shared = page and slog.shared
+    prof = None
+    if slog.profile == stage:
+        prof = cProfile.Profile()
+    if not shared:
+        resetPeakRss()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if prof is not None:
+        try:
+            prof.enable()
+        except ValueError: # one profiler at a time from 3.12, a page in another thread has it
+            prof = None
+    try:
+        yield counts
+    finally:
+        if prof is not None:
+            prof.disable()
+            Path(slog.prof_dir).mkdir(parents=True, exist_ok=True)
+            prof.dump_stats(slog.prof_dir + "/" + stage + "_" +
+                ident.replace('/','_') + ".prof")
+        row = { "stage" : stage, "ident" : ident,
+                "wall" : round(time.perf_counter() - wall,4),
+                "cpu" : round(time.process_time() - cpu,4),
+                "peak_rss_kb" : None if shared else max([peakRss()] +
+                    [inner["peak_rss_kb"] for inner in slog.rows[first:]
+                    if inner["peak_rss_kb"] is not None]) }
+        row.update(counts)
+        with slog.lock:
+            slog.rows.append(row)
+
+""" stage_log for an issue, or None without --metrics; shared unless pages go
+    through a page at a time (or shared is given) """
+def newStageLog(args,shared=None):
+    if args.metrics is None:
+        return None
+    if shared is None:
+        shared = args.pages > 1 or args.queue > 0
+    return stage_log(args.profile,args.out + "/metrics",shared)
+
+""" write stage rows as CSV or JSON (by extension), with totals for each stage """
+def writeMetrics(metrics_file,rows):
+    totals = {}
+    for row in rows:
+        total = totals.setdefault(row["stage"],{ "runs" : 0, "wall" : 0.0, "cpu" : 0.0,
+            "peak_rss_kb" : None })
+        total["runs"] += 1
+        total["wall"] = round(total["wall"] + row["wall"],4)
+        total["cpu"] = round(total["cpu"] + row["cpu"],4)
+        if row["peak_rss_kb"] is not None:
+            total["peak_rss_kb"] = max(total["peak_rss_kb"] or 0,row["peak_rss_kb"])
+
+    if metrics_file.endswith(".csv"):
+        fields = []
+        for row in rows:
+            fields += [field for field in row if field not in fields]
+        with open(metrics_file,"w",newline='') as outfile:
+            writer = csv.DictWriter(outfile,fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(metrics_file,"w") as outfile:
+            json.dump({ "stages" : totals, "rows" : rows }, outfile, indent=4)
+
+    print("%-8s %6s %10s %10s %12s" % ("stage","runs","wall s","cpu s","peak rss kb"))
+    for stage, total in totals.items():
+        print("%-8s %6d %10.2f %10.2f %12s" % (stage,total["runs"],total["wall"],
+            total["cpu"],"" if total["peak_rss_kb"] is None else total["peak_rss_kb"]))
@@ -0,0 +1,199 @@
+"""
+pipeline.py - an issue's pages through the stages at once, with --queue
+
+Each group of stages works on its own pages and hands them on through a
+queue that holds at most --queue pages:
+
+    parse, filter, rebuild -> blocks, tiles -> index, hits -> package
+
+The hocr stages are pure Python and run in worker processes, the image
+stages and the JSON writing in threads, and package, which writes the
+zips, in the caller. Pillow lets go of the GIL while it decodes and
+encodes, so block crops overlap well; tiles only do when pyvips is
+installed (dzsave_buffer runs in libvips), with Pillow's tiler much of
+the work is Python resizing and cropping that holds it. Each group has --pages pages in hand at most, so the
+pages held at once, and their words and pixels, are capped by the queue
+depth whatever the issue size. A group hands pages on in the order it took
+them, so pages come out in page order and the output is the same as a
+page at a time. Blocks and tiles stay together so a page lets go of its
+pixels before it waits behind another page, which could be waiting on
+--memory for them.
+"""
+
+import queue, threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from .consts import PIPE_POLL
+from .images import releasePageImage
+from .metrics import newStageLog
+from .stages import (page_job, parse_stage, filter_stage, rebuild_stage, blocks_stage,
+    tiles_stage, index_stage, hits_stage)
+
+""" pipe - what the group threads share, so one failing stops them all """
+class pipe:
+    def __init__(self, depth):
+        self.depth = depth # pages a queue holds
+        self.stop = threading.Event()
+        self.errors = [] # exceptions from the groups, the first is raised
+
+""" parse, filter and rebuild for a page in a worker process, returns what the
+    later stages need and the rows logged for them """
+def runHocrStages(hfile,ia_folder,args,tname):
+    slog = newStageLog(args,False) # a worker process has one page at a time
+    page = page_job(hfile,ia_folder,args.ext)
+    for stage in (parse_stage(args,tname,slog),filter_stage(args,tname,slog),
+        rebuild_stage(args,tname,slog)):
+        page = stage.runPage(page)
+    return page.words, page.par_regions, [] if slog is None else slog.rows
+
+""" next page from q, raises queue.Empty if the pipe has been stopped """
+def getPipe(pline,q):
+    while True:
+        try:
+            return q.get(timeout=PIPE_POLL)
+        except queue.Empty:
+            if pline.stop.is_set():
+                raise
+
+""" hand a page on to q once there is room, raises queue.Full if the pipe
+    has been stopped """
+def putPipe(pline,q,page):
+    while True:
+        try:
+            return q.put(page,timeout=PIPE_POLL)
+        except queue.Full:
+            if pline.stop.is_set():
+                raise
+
+""" pages from a list into the first queue, None once they are all in """
+def feedPipe(pline,pages,outq):
+    try:
+        for page in pages + [None]:
+            putPipe(pline,outq,page)
+    except queue.Full:
+        pass
+
+""" a group's thread: pages from inq are sent to the pool with submit(pool,page),
+    which returns a future for the finished page; pages go on to outq in the
+    order they came, with at most workers in hand """
+def runPipe(pline,inq,outq,pool,submit,workers):
+    pending = deque()
+    try:
+        while True:
+            page = getPipe(pline,inq)
+            if page is None:
+                break
+            pending.append(submit(pool,page))
+            if len(pending) >= workers:
+                putPipe(pline,outq,pending.popleft().result())
+        while len(pending) > 0:
+            putPipe(pline,outq,pending.popleft().result())
+        putPipe(pline,outq,None)
+    except (queue.Empty, queue.Full): # stopped by another group
+        pass
+    except Exception as err:
+        pline.errors.append(err)
+        pline.stop.set()
+    finally:
+        for future in pending:
+            future.cancel()
+
+""" future for a page done already, for pages that skip a group """
+def donePage(page):
+    future = Future()
+    future.set_result(page)
+    return future
+
+""" threads for the pipeline's groups and the pools they run pages in """
+class pipe_groups:
+    def __init__(self, args, tname, slog):
+        self.args = args
+        self.tname = tname
+        self.slog = slog
+        self.image_stages = [blocks_stage(args,tname,slog),tiles_stage(args,tname,slog)]
+        self.json_stages = [index_stage(args,tname,slog),hits_stage(args,tname,slog)]
+
+    """ hocr stages in a worker process, the page's words and regions are
+        filled in when they come back """
+    def submitHocr(self, pool, page):
+        if page.reused:
+            return donePage(page)
+        hocr = pool.submit(runHocrStages,page.hfile,page.ia_folder,self.args,self.tname)
+        future = Future()
+        def gotHocr(hocr):
+            try:
+                page.words, page.par_regions, rows = hocr.result()
+                if self.slog is not None:
+                    with self.slog.lock:
+                        self.slog.rows += rows
+                future.set_result(page)
+            except BaseException as err:
+                future.set_exception(err)
+        hocr.add_done_callback(gotHocr)
+        return future
+
+    """ blocks and tiles in a thread """
+    def submitImages(self, pool, page):
+        return pool.submit(self.runImages,page)
+
+    """ blocks and tiles, then the pixels are let go of """
+    def runImages(self, page):
+        for stage in self.image_stages:
+            page = stage.runPage(page)
+        releasePageImage(page.pimg)
+        return page
+
+    """ page and terms JSON and hits, one page at a time so the disk is not
+        fought over """
+    def submitJson(self, pool, page):
+        return pool.submit(self.runJson,page)
+
+    """ index then hits for a page """
+    def runJson(self, page):
+        for stage in self.json_stages:
+            page = stage.runPage(page)
+        return page
+
+""" pages through every stage up to package as a pipeline of pipe_groups,
+    pages come back in page order """
+def runThruPipeline(pages,args,tname,slog=None):
+    pline = pipe(max(args.queue,1))
+    groups = pipe_groups(args,tname,slog)
+    workers = max(args.pages,1)
+    pools = [ProcessPoolExecutor(max_workers=workers),ThreadPoolExecutor(max_workers=workers),
+        ThreadPoolExecutor(max_workers=1)]
+    submits = [groups.submitHocr,groups.submitImages,groups.submitJson]
+    queues = [queue.Queue(maxsize=pline.depth) for cnt in range(len(submits) + 1)]
+
+    #worker processes are forked before any group thread is, so none can
+    #be holding a lock at the time
+    pools[0].submit(int).result()
+
+    threads = [threading.Thread(target=feedPipe,args=(pline,list(pages),queues[0]),daemon=True)]
+    for cnt, (pool, submit) in enumerate(zip(pools,submits)):
+        threads.append(threading.Thread(target=runPipe,args=(pline,queues[cnt],
+            queues[cnt + 1],pool,submit,1 if pool is pools[-1] else workers),daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            try:
+                page = getPipe(pline,queues[-1])
+            except queue.Empty:
+                break
+            if page is None:
+                break
+            yield page
+    finally:
+        pline.stop.set()
+        for thread in threads:
+            thread.join()
+        for pool in pools:
+            pool.shutdown(cancel_futures=True)
+        for page in pages: # pixels of pages that did not get through
+            releasePageImage(page.pimg)
+
+    if len(pline.errors) > 0:
+        raise pline.errors[0]
@@ -0,0 +1,138 @@
+"""
+shard.py - a title split over several machines with --shard, put back together with --merge
+
+Each issue folder goes to one of the shards, weighed by its pages and
+image bytes and handed out heaviest first to the shard with the least so
+far, so every machine working out the split from the same folders gets
+the same one. A shard writes its build script, and with -k its _bulk
+files, under the output folder's build folder as TITLE.shardIofN, plus
+TITLE.shardIofN.json with each of its issues' build lines. --merge reads
+every shard's JSON, checks they are all there and that each issue has
+its odw.json, and writes the build script (or _bulk files) a run over
+the whole title would have.
+"""
+
+import glob, json, os, sys
+
+from .bulk import bulk_writer, addBulkLines, closeBulkWriter, loadBulk
+from .consts import SHARD_PAGE_BYTES
+
+""" (i, n) from an --shard value, None if it is not i/n with 1 <= i <= n """
+def parseShard(shard):
+    try:
+        num, count = [int(part) for part in shard.split('/')]
+    except ValueError:
+        return None
+    if count < 1 or num < 1 or num > count:
+        return None
+    return num, count
+
+""" weight of an issue folder, its pages as image bytes plus its image bytes """
+def folderCost(folder,ext):
+    cost = 0
+    for hfile in glob.glob(folder + "/*.hocr"):
+        if hfile.endswith("_odw.hocr"):
+            continue
+        cost += SHARD_PAGE_BYTES
+        img_file = hfile.rsplit('.',1)[0] + "." + ext
+        if os.path.exists(img_file):
+            cost += os.path.getsize(img_file)
+    return cost
+
+""" issue folders for shard num of count, in folder order; heaviest go first, each
+    to the shard with the least so far (the lowest numbered on a tie) """
+def shardFolders(folders,num,count,ext):
+    loads = [0] * count
+    shard_folders = []
+    costs = sorted([(folderCost(folder,ext),folder) for folder in folders],
+        key=lambda cost: (-cost[0],cost[1]))
+    for cost, folder in costs:
+        least = loads.index(min(loads))
+        loads[least] += cost
+        if least == num - 1:
+            shard_folders.append(folder)
+    return sorted(shard_folders)
+
+""" TITLE.shardIofN under the build folder, the shard's files are named from this """
+def shardBase(args,num,count):
+    return "%s/build/%s.shard%dof%d" % (args.out,os.path.basename(args.folder.rstrip('/')),
+        num,count)
+
+""" what --merge needs from a shard, written once the shard has run """
+def writeShard(shard_base,num,count,args,issue_lines,failed):
+    shard_obj = { "shard" : num, "shards" : count, "bulk" : args.bulk > 0,
+        "issues" : issue_lines, "failed" : failed }
+    with open(shard_base + ".json.tmp","w") as outfile:
+        json.dump(shard_obj,outfile)
+    os.replace(shard_base + ".json.tmp",shard_base + ".json")
+
+""" put the shards' build lines together in folder order, as one run over the
+    title would have; exits non zero if a shard or an issue's odw.json is missing """
+def runMerge(args):
+    title = os.path.basename(args.folder.rstrip('/'))
+    shard_files = sorted(glob.glob("%s/build/%s.shard*of*.json" % (args.out,title)))
+    shards = {}
+    counts = set()
+    problems = []
+    for shard_file in shard_files:
+        with open(shard_file) as f:
+            shard_obj = json.load(f)
+        shards[shard_obj["shard"]] = shard_obj
+        counts.add(shard_obj["shards"])
+
+    if len(shards) == 0:
+        problems.append("no shards for %s in %s/build" % (title,args.out))
+    elif len(counts) > 1:
+        problems.append("shards from runs split %s ways, the old ones need removing" %
+            " and ".join(str(count) for count in sorted(counts)))
+    else:
+        count = counts.pop()
+        for num in range(1,count + 1):
+            if num not in shards:
+                problems.append("shard %d of %d has not finished" % (num,count))
+
+    issue_lines = {}
+    for num, shard_obj in sorted(shards.items()):
+        if shard_obj["bulk"] != (args.bulk > 0):
+            problems.append("shard %d was run %s -k, --merge needs the same" %
+                (num,"with" if shard_obj["bulk"] else "without"))
+        for folder in shard_obj["failed"]:
+            problems.append("shard %d failed on %s" % (num,folder))
+        for folder, lines in shard_obj["issues"].items():
+            if folder in issue_lines:
+                problems.append("%s is in more than one shard" % folder)
+            issue_lines[folder] = lines
+
+    #every issue in the title has to have been built by some shard
+    folders = sorted(issue_lines)
+    if os.path.isdir(args.folder):
+        for folder in sorted(glob.glob(args.folder + "/*")):
+            if folder not in issue_lines:
+                problems.append("%s is not in any shard" % folder)
+    for folder in folders:
+        ia_folder = folder.replace('/','_').replace('-','')
+        if not os.path.exists(args.out + "/cloud/" + ia_folder + "/odw.json"):
+            problems.append("%s has no %s" % (folder,args.out + "/cloud/" + ia_folder + "/odw.json"))
+
+    if len(problems) > 0:
+        for problem in problems:
+            print("merge:",problem)
+        sys.exit(1)
+
+    build_lines = [line for folder in folders for line in issue_lines[folder]]
+    if args.bulk > 0:
+        bulk_base = args.out + "/build/" + title
+        for bulk_file in glob.glob(bulk_base + "_*_[0-9][0-9][0-9][0-9].ndjson*"):
+            os.remove(bulk_file)
+        bwriter = bulk_writer(bulk_base,args.bulk * 1024 * 1024,args.terms == "packed")
+        addBulkLines(bwriter,build_lines)
+        build_lines = closeBulkWriter(bwriter)
+
+    with open(args.folder + ".sh","w") as outfile:
+        outfile.writelines(build_lines)
+    print("merged %d shard(s), %d issue(s) into %s" % (len(shards),len(folders),
+        args.folder + ".sh"))
+
+    if args.bulk > 0 and args.upload > 0:
+        loaded, not_loaded = loadBulk(bwriter.bulk_files,args.upload)
+        print("loaded %d document(s) into ElasticSearch, %d failed" % (loaded,not_loaded))
@@ -0,0 +1,163 @@
+"""
+spool.py - daemon mode, issues are run from job files dropped in a spool folder
+
+A job is a text file ending in .job with one issue folder per line (the
+TITLE/YYYY-MM-DD layout, relative to where the daemon runs). Jobs are
+taken in name order by renaming them to .run, and when every issue in one
+has finished it is replaced by a .done file holding its build script, or
+a .failed file with the errors. Only --workers jobs are taken at once and
+the worker processes are kept between jobs, so imports and caches stay warm.
+"""
+
+import glob, os, signal, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from copy import copy
+from pathlib import Path
+
+from .bulk import bulk_writer, addBulkLines, closeBulkWriter, loadBulk
+from .consts import SPOOL_POLL
+from .issue import runIssueWorker, issueResult
+from .metrics import writeMetrics
+
+""" spool_job - a job file that has been taken, with its issues' futures """
+class spool_job:
+    def __init__(self, run_file, folders):
+        self.run_file = run_file
+        self.job_base = run_file.rsplit('.',1)[0]
+        self.folders = folders # issue folders, in the order given
+        self.futures = [] # one per folder, None for a folder that is not there
+
+""" take a job by renaming it to .run, None if another daemon got there first """
+def claimJob(job_file):
+    run_file = job_file.rsplit('.',1)[0] + ".run"
+    try:
+        os.rename(job_file,run_file)
+    except FileNotFoundError:
+        return None
+    with open(run_file) as f:
+        folders = [line.strip().rstrip('/') for line in f
+            if len(line.strip()) > 0 and not line.startswith('#')]
+    return spool_job(run_file,folders)
+
+""" send a job's issues to the pool, each with the title it is under as --folder """
+def submitJob(pool,job,args):
+    job.futures = []
+    for folder in job.folders:
+        if not os.path.isdir(folder):
+            job.futures.append(None)
+            continue
+        job_args = copy(args)
+        job_args.folder = folder.split('/')[0]
+        job.futures.append(pool.submit(runIssueWorker,folder,job_args))
+
+""" write a marker file whole, so whatever watches for it never sees part of one """
+def writeMarker(marker_file,lines):
+    with open(marker_file + ".tmp","w") as outfile:
+        outfile.writelines(lines)
+    os.replace(marker_file + ".tmp",marker_file)
+
+""" gather a finished job's issues and leave its .done or .failed marker,
+    returns the job's stage rows """
+def finishJob(job,args):
+    build_lines = []
+    errors = []
+    rows = []
+    for folder, future in zip(job.folders,job.futures):
+        if future is None:
+            errors.append("failed: %s\nmissing hocr folder\n" % folder)
+            continue
+        folder, lines, frows, err = issueResult(folder,future)
+        rows += frows
+        if err is None:
+            build_lines += lines
+        else:
+            errors.append("failed: %s\n%s" % (folder,err))
+
+    #_bulk files are put together for each job, named after it
+    if args.bulk > 0 and len(errors) == 0:
+        Path(args.out + "/build").mkdir(parents=True, exist_ok=True)
+        bwriter = bulk_writer(args.out + "/build/" + os.path.basename(job.job_base),
+            args.bulk * 1024 * 1024,args.terms == "packed")
+        addBulkLines(bwriter,build_lines)
+        build_lines = closeBulkWriter(bwriter)
+        if args.upload > 0:
+            loaded, not_loaded = loadBulk(bwriter.bulk_files,args.upload)
+            if not_loaded > 0:
+                errors.append("%d document(s) not loaded into ElasticSearch\n" % not_loaded)
+
+    if len(errors) > 0:
+        print("failed job:", job.job_base)
+        writeMarker(job.job_base + ".failed",errors)
+    else:
+        print("finished job:", job.job_base)
+        writeMarker(job.job_base + ".done",build_lines)
+    os.remove(job.run_file)
+    return rows
+
+""" worker processes for jobs, they leave ctrl-c to the daemon so running
+    issues are not cut off """
+def startPool(max_jobs):
+    return ProcessPoolExecutor(max_workers=max_jobs,initializer=signal.signal,
+        initargs=(signal.SIGINT,signal.SIG_IGN))
+
+""" watch the spool folder and run jobs as they come in, until SIGTERM or SIGINT;
+    jobs already taken are finished before stopping """
+def runSpool(args):
+    Path(args.spool).mkdir(parents=True, exist_ok=True)
+
+    #jobs taken by a daemon that did not finish them are run again
+    for run_file in glob.glob(args.spool + "/*.run"):
+        os.rename(run_file,run_file.rsplit('.',1)[0] + ".job")
+
+    if args.metrics is not None:
+        for prof_file in glob.glob(args.out + "/metrics/*.prof"):
+            os.remove(prof_file)
+
+    stopping = []
+    def stop(signum,frame):
+        print("stopping once running jobs are finished")
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM,stop)
+    signal.signal(signal.SIGINT,stop)
+
+    max_jobs = max(args.workers,1)
+    jobs = []
+    metric_rows = []
+    print("watching", args.spool, "for jobs")
+
+    pool = startPool(max_jobs)
+    try:
+        while len(stopping) == 0 or len(jobs) > 0:
+            if len(stopping) == 0:
+                for job_file in sorted(glob.glob(args.spool + "/*.job")):
+                    if len(jobs) >= max_jobs:
+                        break
+                    job = claimJob(job_file)
+                    if job is not None:
+                        print("starting job:", job.job_base)
+                        try:
+                            submitJob(pool,job,args)
+                        except BrokenProcessPool: # a worker was killed, start over
+                            pool.shutdown(wait=False)
+                            pool = startPool(max_jobs)
+                            submitJob(pool,job,args)
+                        jobs.append(job)
+
+            #only issues still running, a finished one would end the wait at once
+            running = [future for job in jobs for future in job.futures
+                if future is not None and not future.done()]
+            if len(running) > 0:
+                wait(running,timeout=SPOOL_POLL,return_when=FIRST_COMPLETED)
+            elif len(jobs) == 0:
+                time.sleep(SPOOL_POLL)
+
+            for job in [job for job in jobs if all(future is None or future.done()
+                for future in job.futures)]:
+                metric_rows += finishJob(job,args)
+                jobs.remove(job)
+    finally:
+        pool.shutdown()
+
+    if args.metrics is not None:
+        writeMetrics(args.metrics,metric_rows)
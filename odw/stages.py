@@ -0,0 +1,267 @@
+"""
+stages.py - the steps a page goes through, each one a generator stage
+
+Pages are page_job objects and go through the stages in order:
+
+    parse -> filter -> rebuild -> blocks -> tiles -> index -> hits -> package
+
+Each stage takes an iterable of pages and yields them again with its part
+done, so one page can be in the image stages while the next is parsed.
+Pages reused from the ledger go straight through to package.
+"""
+
+from datetime import datetime
+import json, os
+
+from .hits import pageHits, writeHits
+from .hocr import readHocr, filterWords, runThruWords
+from .images import page_image, getPageSize, runThruBlocks, runThruTiles
+from .metrics import logStage
+from .terms import sortOutESJson
+from .zips import runThruZips
+
+""" build out JSON structure """
+def sortOutJson(out_folder, obj_folder, imgs, json_imgs):
+
+    last_pg = len(imgs) - 1
+    json_obj = {
+        "@context": "http://iiif.io/api/presentation/2/context.json",
+        "@type": "sc:Manifest",
+        "@id": obj_folder + "/manifest.json",
+        "label" : "",
+        "description" : "",
+        "logo" : "",
+        "sequences": [
+            {
+                "@type": "sc:Sequence",
+                "canvases": json_imgs
+            }
+        ],
+        "structures": [
+            {
+                "@id": imgs[0] + "/ranges/1",
+                "@type": "sc:Range",
+                "label": "Front Page",
+                "canvases": [
+                    imgs[0] + "/canvas/1"
+                ],
+                "within": ""
+            },
+            {
+                "@id": imgs[last_pg] + "/ranges/" + str(last_pg + 1),
+                "@type": "sc:Range",
+                "label": "Last Page",
+                "canvases": [
+                    imgs[last_pg] + "/canvas/" + str(last_pg + 1)
+                ],
+                "within": ""
+            }
+        ]
+    }
+
+    json_dump = json.dumps(json_obj, indent=4)
+    with open(out_folder + "/manifest.json", "w") as outfile:
+        outfile.write(json_dump)
+
+""" page_job - one page of an issue and what the stages have made for it so far """
+class page_job:
+    def __init__(self, hfile, ia_folder, ext, budget=None):
+        self.hfile = hfile
+        self.file_base = hfile.rsplit('.', 1)[0]
+        self.jfile = self.file_base.rsplit('/',1)[1]
+        self.jfile_base = ia_folder + '/' + self.jfile
+        self.ia_folder = ia_folder
+        self.pimg = page_image(self.file_base + "." + ext,budget)
+        self.cols = None # words as read from the hocr
+        self.words = None # word_table after the confidence cut
+        self.page_node = None
+        self.par_regions = []
+        self.zip_dirs = []
+        self.build_lines = []
+        self.hits = [] # pageHits, for the issue's hits.bin
+        self.reused = False # zips and JSON came from the last run
+
+""" page_stage - one step for every page, run() does the work and wanted()
+    says whether a page needs it; slog gets a row for each page run """
+class page_stage:
+    name = None
+
+    def __init__(self, args, tname=None, slog=None):
+        self.args = args
+        self.tname = tname # temp folder the issue is built in
+        self.slog = slog
+
+    def __call__(self, pages):
+        for page in pages:
+            yield self.runPage(page)
+
+    def runPage(self, page):
+        if not page.reused and self.wanted(page):
+            with logStage(self.slog,self.name,page.jfile_base,True) as counts:
+                self.run(page,counts)
+        return page
+
+    def wanted(self, page):
+        return True
+
+    def run(self, page, counts):
+        raise NotImplementedError
+
+""" read the words out of the hocr file """
+class parse_stage(page_stage):
+    name = "parse"
+
+    def run(self, page, counts):
+        page.cols, page.page_node = readHocr(page.hfile)
+        counts.update(words=len(page.cols.wtext))
+
+""" drop words under the confidence threshold """
+class filter_stage(page_stage):
+    name = "filter"
+
+    def run(self, page, counts):
+        page.words = filterWords(page.cols,int(self.args.conf),self.args.number)
+        page.cols = None
+        counts.update(words=len(page.words),dropped=page.words.dropped)
+
+""" write the cleaned _odw.hocr, which also finds the paragraph regions """
+class rebuild_stage(page_stage):
+    name = "rebuild"
+
+    def run(self, page, counts):
+        result_title = self.args.title
+        if self.args.title == None:
+            result_title = page.file_base + "_odw.hocr"
+        page.par_regions = runThruWords(page.file_base,page.words,page.page_node,
+            int(self.args.conf),self.args.lang,result_title)
+        page.page_node = None
+        counts.update(pars=len(page.par_regions))
+
+""" image blocks - not needed if no text """
+class blocks_stage(page_stage):
+    name = "blocks"
+
+    def wanted(self, page):
+        return self.args.block and len(page.par_regions) > 0
+
+    def run(self, page, counts):
+        zip_dir, page.par_regions = runThruBlocks(page.jfile_base,page.pimg,
+            self.tname,page.par_regions,self.args.dir,self.args.min)
+        page.zip_dirs.append(zip_dir)
+        counts.update(blocks=zip_dir.cnt,bytes=zip_dir.size)
+
+""" IIIF tiles, can have these with no text """
+class tiles_stage(page_stage):
+    name = "tiles"
+
+    def wanted(self, page):
+        return self.args.vips
+
+    def run(self, page, counts):
+        zip_dir = runThruTiles(page.jfile_base,page.pimg,self.tname,self.args.dir)
+        page.zip_dirs.append(zip_dir)
+        counts.update(tiles=zip_dir.cnt,bytes=zip_dir.size)
+
+""" page and terms JSON for ElasticSearch """
+class index_stage(page_stage):
+    name = "index"
+
+    def wanted(self, page):
+        return self.args.json and len(page.par_regions) > 0
+
+    def run(self, page, counts):
+        args = self.args
+        pg_num = int(page.file_base.rsplit('-',1)[1])
+        np_date = page.file_base.split('/')[1]
+        dt_object = datetime.strptime(np_date,"%Y-%m-%d")
+        date_str = dt_object.strftime("%B %-d, %Y")
+        title_str = "%s. %s - pg. %d" % (args.title,date_str,pg_num)
+
+        json_page = { "pid" : args.folder + "_" + page.jfile,
+                      "title" : title_str,
+                      "is_member_of_collection" : args.folder,
+                      "mime_type" : "image/" + args.ext,
+                      "language" : args.lang,
+                      "full_text" : ""
+        }
+        page.build_lines += sortOutESJson(
+                json_page,
+                args.folder,
+                args.out + "/build/" + page.ia_folder,
+                page.jfile,page.words,page.par_regions,args.bulk > 0,args.terms == "packed")
+        counts.update(words=len(page.words))
+
+""" words by term for the issue's hits.bin """
+class hits_stage(page_stage):
+    name = "hits"
+
+    def wanted(self, page):
+        return self.args.hits and len(page.par_regions) > 0
+
+    def run(self, page, counts):
+        page.hits = pageHits(page.words,page.par_regions)
+        counts.update(words=len(page.hits))
+
+""" package_stage - gathers every page's zips and canvas, the manifest and
+    odw.zip are written once the last page has gone through """
+class package_stage(page_stage):
+    name = "package"
+
+    def __init__(self, args, tname=None, slog=None):
+        super().__init__(args,tname,slog)
+        self.zip_dirs = []
+        self.imgs_ident = []
+        self.json_imgs = []
+        self.page_hits = [] # (jfile_base, pageHits) in page order
+        self.last = None
+
+    def runPage(self, page):
+        self.zip_dirs += page.zip_dirs
+        if len(page.hits) > 0:
+            self.page_hits.append((page.jfile_base,page.hits))
+        if len(self.zip_dirs) > 0:
+            self.addCanvas(page)
+        self.last = page
+        return page
+
+    """ create manifest entry for the page's zips """
+    def addCanvas(self, page):
+        pg_no = len(self.imgs_ident) + 1
+        w,h = getPageSize(page.pimg)
+        self.json_imgs.append({ "@type": "sc:Canvas",
+            "@id": page.jfile_base + "/canvas/" + str(pg_no),
+            "label": "Pg. " + str(pg_no),
+            "width": w,
+            "height": h,
+            "images": [{
+                "@type": "oa:Annotation",
+                "motivation": "sc:painting",
+                "on": page.jfile_base + "/canvas/" + str(pg_no),
+                "resource": {
+                    "@type": "dctypes:Image",
+                    "@id": page.jfile_base + "/full/104,/0/default.jpg",
+                        "service": {
+                            "@context":  "http://iiif.io/api/image/2/context.json",
+                            "@id": page.jfile_base,
+                            "profile": "http://iiif.io/api/image/2/level2.json"
+                         }
+                }
+            }]
+        })
+        self.imgs_ident.append(page.jfile_base)
+
+    """ manifest, hits.bin and odw.zip for the issue, once every page is in """
+    def finish(self, ia_folder):
+        offset_folder = self.tname + '/cloud/' + ia_folder + '/'
+        if len(self.imgs_ident) > 0 and self.last is not None and \
+            self.imgs_ident[-1] == self.last.jfile_base:
+            sortOutJson(offset_folder.rstrip('/'),self.last.jfile_base,
+                self.imgs_ident,self.json_imgs)
+        with logStage(self.slog,self.name,ia_folder) as counts:
+            if self.args.hits:
+                writeHits(offset_folder + "hits.bin",self.page_hits)
+            index_folder = None
+            if self.args.dir:
+                index_folder = self.tname + '/cache/' + ia_folder + '/'
+            runThruZips(offset_folder,ia_folder,self.zip_dirs,index_folder)
+            counts.update(zips=len(self.zip_dirs),bytes=os.path.getsize(offset_folder + "odw.zip"))
@@ -0,0 +1,266 @@
+"""
+terms.py - ElasticSearch page and terms documents
+
+With --terms packed a page's terms document is written compact instead, as
+gzip'd JSON with a column per field (TERMS_SCHEMA):
+
+    { "schema" : "odw-terms/1", "newscode" : ..., "issueident" : ...,
+      "blocks" : [bident, ...],
+      "text" : [...], "x0" : [...], "y0" : [...], "x1" : [...], "y1" : [...],
+      "conf" : [...], "fm" : [...], "block" : [index into blocks, ...] }
+
+expandTerms turns it back into the document ElasticSearch gets, and
+python -m odw.terms FILE... prints that document for each file.
+"""
+
+import gzip, json, sys
+from pathlib import Path
+import numpy as np
+
+from .consts import PAGE_INDEX, TERMS_INDEX, JS_TYPE, GRID_SIZE, TERMS_SCHEMA
+
+""" par_index - grid of cells on the page, each with the par_regions over it """
+class par_index:
+    def __init__(self, regions, cell=GRID_SIZE):
+        self.regions = []
+        self.cell = cell
+        self.cells = {} # (col,row) -> region positions, in list order
+
+        for region in regions:
+            addParRegion(self,region)
+
+""" add region to the end of the index list """
+def addParRegion(pindex,region):
+    cell = pindex.cell
+    i = len(pindex.regions)
+    pindex.regions.append(region)
+
+    for col in range(min(region.x0,region.x1) // cell,
+        max(region.x0,region.x1) // cell + 1):
+        for row in range(min(region.y0,region.y1) // cell,
+            max(region.y0,region.y1) // cell + 1):
+            pindex.cells.setdefault((col,row),[]).append(i)
+
+""" find first par region (in list order) that holds the word box """
+def findParRegion(pindex,x0,y0,x1,y1):
+
+    if x1 < x0 or y1 < y0: #odd box, fall back to a full scan
+        candidates = range(len(pindex.regions))
+    else:
+        candidates = pindex.cells.get((x0 // pindex.cell, y0 // pindex.cell),())
+
+    for i in candidates:
+        region = pindex.regions[i]
+        if x0 >= region.x0 and y0 >= region.y0 and x1 <= region.x1 and y1 <= region.y1:
+            return region
+    return None
+
+""" the funky word identifier for the term index """
+def termIdent(wtext,x0,y0,x1,y1,bident,conf,fmt):
+    return "%s %08d_%08d_%08d_%08d_%s_%03d_%03d" % (wtext,x0,y0,x1,y1,bident,conf,fmt)
+
+""" term index has a funky layout and identifier is specified here """
+def sortOutTermVals(wtext,x0,y0,x1,y1,conf,pindex,word_avg):
+
+    region_ident = ""
+    region = findParRegion(pindex,x0,y0,x1,y1)
+    if region is not None:
+        fmt = percentage(y1 - y0,word_avg)
+
+        region_ident = termIdent(wtext,x0,y0,x1,y1,region.bident,conf,fmt)
+
+        return region_ident, fmt
+    return region_ident, 0
+
+""" compact terms columns for a page, words outside every region are left out
+    as they are from the terms document """
+def packTerms(np_code,issueident,words,pindex,word_avg):
+    packed = { "schema" : TERMS_SCHEMA, "newscode" : np_code, "issueident" : issueident,
+        "blocks" : [], "text" : [], "x0" : [], "y0" : [], "x1" : [], "y1" : [],
+        "conf" : [], "fm" : [], "block" : [] }
+    blocks = {}
+
+    wx0 = words.x0.tolist()
+    wy0 = words.y0.tolist()
+    wx1 = words.x1.tolist()
+    wy1 = words.y1.tolist()
+    wconf = words.wconf.tolist()
+
+    for cnt,wtext in enumerate(words.wtext):
+        region = findParRegion(pindex,wx0[cnt],wy0[cnt],wx1[cnt],wy1[cnt])
+        if region is None:
+            continue
+        if region.bident not in blocks:
+            blocks[region.bident] = len(packed["blocks"])
+            packed["blocks"].append(region.bident)
+        packed["text"].append(wtext)
+        packed["x0"].append(wx0[cnt])
+        packed["y0"].append(wy0[cnt])
+        packed["x1"].append(wx1[cnt])
+        packed["y1"].append(wy1[cnt])
+        packed["conf"].append(wconf[cnt])
+        packed["fm"].append(percentage(wy1[cnt] - wy0[cnt],word_avg))
+        packed["block"].append(blocks[region.bident])
+
+    return packed
+
+""" terms document for ElasticSearch from packTerms columns """
+def expandTerms(packed):
+    ientries = []
+    for cnt,wtext in enumerate(packed["text"]):
+        x0 = packed["x0"][cnt]
+        y0 = packed["y0"][cnt]
+        x1 = packed["x1"][cnt]
+        y1 = packed["y1"][cnt]
+        conf = packed["conf"][cnt]
+        fm = packed["fm"][cnt]
+        ientries.append({
+            "word" : termIdent(wtext,x0,y0,x1,y1,packed["blocks"][packed["block"][cnt]],
+                conf,fm),
+            "x0"   : x0,
+            "y0"   : y0,
+            "x1"   : x1,
+            "y1"   : y1,
+            "conf" : conf,
+            "fm"   : fm
+        })
+
+    return {
+            "newscode" : packed["newscode"],
+            "issueident" : packed["issueident"],
+            "terms" : ientries
+    }
+
+""" terms document from a terms file, compact ones are expanded """
+def readTerms(terms_file):
+    if terms_file.endswith(".gz"):
+        with gzip.open(terms_file,"rt") as f:
+            json_obj = json.load(f)
+    else:
+        with open(terms_file) as f:
+            json_obj = json.load(f)
+    if json_obj.get("schema") == TERMS_SCHEMA:
+        return expandTerms(json_obj)
+    return json_obj
+
+""" action and source lines for _bulk from a compact terms file """
+def termsNdjson(terms_file):
+    json_obj = readTerms(terms_file)
+    doc_id = json.dumps({ "index" : { "_id" : json_obj["issueident"] } })
+    return (doc_id + "\n" + json.dumps(json_obj,separators=(',',':')) + "\n").encode()
+
+""" pull together ElasticSearch JSON format and corresponding shell script(s),
+    or with bulk the NDJSON pieces that go into _bulk files """
+def sortOutESJson(json_page,np_code,json_folder,jfile,words,par_regions,bulk=False,
+    packed=False):
+
+    Path(json_folder).mkdir(parents=True, exist_ok=True)
+    word_avg = calcAvg(words)
+    pindex = par_index(par_regions)
+
+    if packed:
+        return sortOutPackedJson(json_page,np_code,json_folder,jfile,
+            packTerms(np_code,np_code + "_" + jfile,words,pindex,word_avg),bulk)
+
+    ientries = []
+    terms = []
+
+    wx0 = words.x0.tolist()
+    wy0 = words.y0.tolist()
+    wx1 = words.x1.tolist()
+    wy1 = words.y1.tolist()
+    wconf = words.wconf.tolist()
+
+    for cnt,wtext in enumerate(words.wtext):
+        wentry, fm = sortOutTermVals(wtext,
+                wx0[cnt],wy0[cnt],wx1[cnt],wy1[cnt],wconf[cnt],
+                pindex,word_avg)
+        if len(wentry) > 0:
+            index_entry = {
+                "word" : wentry,
+                "x0"   : wx0[cnt],
+                "y0"   : wy0[cnt],
+                "x1"   : wx1[cnt],
+                "y1"   : wy1[cnt],
+                "conf" : wconf[cnt],
+                "fm"   : fm
+            }
+            ientries.append(index_entry)
+            terms.append(wtext)
+
+    json_obj = {
+            "newscode" : np_code,
+            "issueident" : np_code + "_" + jfile,
+            "terms" : ientries
+    }
+    json_page["full_text"] = " ".join(terms)
+
+    #one action and source pair per index, gathered into _bulk files by the caller
+    if bulk:
+        doc_id = json.dumps({ "index" : { "_id" : np_code + "_" + jfile } })
+        json_file = json_folder + "/" + jfile + ".ndjson"
+        with open(json_file,"w") as outfile:
+            outfile.write(doc_id + "\n" + json.dumps(json_page,separators=(',',':')) + "\n")
+        json_terms_file = json_folder + "/" + jfile + "_terms.ndjson"
+        with open(json_terms_file,"w") as outfile:
+            outfile.write(doc_id + "\n" + json.dumps(json_obj,separators=(',',':')) + "\n")
+        return [[PAGE_INDEX,json_file],[TERMS_INDEX,json_terms_file]]
+
+    json_dump = json.dumps(json_obj, indent=4)
+
+    json_terms_file = json_folder + "/" + jfile + "_terms.json"
+    with open(json_terms_file,"w") as outfile:
+        outfile.write(json_dump)
+
+    json_dump = json.dumps(json_page, indent=4)
+    json_file = json_folder + "/" + jfile + ".json"
+    with open(json_file,"w") as outfile:
+        outfile.write(json_dump)
+
+    #build script lines are written out by the caller, in issue order
+    return ["curl -XPOST \"%s/_doc/%s_%s\" -H \"%s\" -d @%s\n" % 
+                (PAGE_INDEX,np_code,jfile,JS_TYPE,json_file),
+            "curl -XPOST \"%s/_doc/%s_%s\" -H \"%s\" -d @%s\n" % 
+                (TERMS_INDEX,np_code,jfile,JS_TYPE,json_terms_file)]
+
+""" page document and compact terms file, terms are expanded again as they are loaded;
+    the build script expands them with python3 -m odw.terms, so odw has to be importable
+    where it runs, and nothing is posted if that fails """
+def sortOutPackedJson(json_page,np_code,json_folder,jfile,packed,bulk):
+    json_page["full_text"] = " ".join(packed["text"])
+
+    json_terms_file = json_folder + "/" + jfile + "_terms.json.gz"
+    with gzip.open(json_terms_file,"wt",compresslevel=9) as outfile:
+        json.dump(packed,outfile,separators=(',',':'))
+
+    if bulk:
+        doc_id = json.dumps({ "index" : { "_id" : np_code + "_" + jfile } })
+        json_file = json_folder + "/" + jfile + ".ndjson"
+        with open(json_file,"w") as outfile:
+            outfile.write(doc_id + "\n" + json.dumps(json_page,separators=(',',':')) + "\n")
+        return [[PAGE_INDEX,json_file],[TERMS_INDEX,json_terms_file]]
+
+    json_dump = json.dumps(json_page, indent=4)
+    json_file = json_folder + "/" + jfile + ".json"
+    with open(json_file,"w") as outfile:
+        outfile.write(json_dump)
+
+    return ["curl -XPOST \"%s/_doc/%s_%s\" -H \"%s\" -d @%s\n" %
+                (PAGE_INDEX,np_code,jfile,JS_TYPE,json_file),
+            "terms=$(python3 -m odw.terms %s) && printf '%%s' \"$terms\" | curl -XPOST \"%s/_doc/%s_%s\" -H \"%s\" --data-binary @-\n" %
+                (json_terms_file,TERMS_INDEX,np_code,jfile,JS_TYPE)]
+
+""" calculate percentage """
+def percentage(height, w_avg):
+  return int(round(100 * float(height)/float(w_avg),0))
+
+""" calculate average """
+def calcAvg(words):
+    if len(words) == 0: return 0
+    total = int(np.sum(words.y1 - words.y0,dtype=np.int64))
+    return round(total/len(words),2)
+
+if __name__ == "__main__":
+    #terms documents as ElasticSearch gets them, one line for each file
+    for terms_file in sys.argv[1:]:
+        print(json.dumps(readTerms(terms_file),separators=(',',':')))
@@ -0,0 +1,264 @@
+"""
+zips.py - stored zips for blocks and tiles, odw.zip and where things sit in them
+"""
+
+import glob, io, json, mmap, os, struct, time, zipfile
+from pathlib import Path
+
+from .consts import ZIP_END, ZIP_END_SIZE, ZIP64_LOC, ZIP64_LOC_SIZE, ZIP64_END, ZIP64_END_SIZE
+from .consts import ZIP_INDEX, ZIP_INDEX_HEADER, ZIP_INDEX_ENTRY
+from .hits import readHitsHead
+
+""" zip_info - zip directory info """
+class zip_info:
+    def __init__(self, fname, offset, size, ztype, cnt=0):
+        self.fname = fname
+        self.offset = offset
+        self.size = size
+        self.ztype = ztype
+        self.cnt = cnt # number of entries, when known
+
+""" zip_writer - stored zip written in one pass """
+class zip_writer:
+    def __init__(self, zip_file, ztype):
+        self.zip_file = zip_file
+        self.zipf = zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_STORED,
+            allowZip64=True, compresslevel=None)
+        self.ztype = ztype
+        self.cnt = 0 # entries added
+
+""" create zip file based on dir/folder path """
+def zipdir(path, ziph, zip_name, zip_rep):
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            source_file = os.path.join(root, file)
+            out_file = source_file.replace(path,zip_rep)
+            if len(zip_name) > 0:
+                out_file = source_file.replace(zip_rep,"")
+            if file not in zip_name:
+                ziph.write(source_file,out_file)
+
+""" add bytes to zip as a stored entry """
+def addZipEntry(zwriter,name,data):
+    zinfo = zipfile.ZipInfo(name,date_time=time.localtime()[:6])
+    zinfo.external_attr = 0o644 << 16
+    zwriter.zipf.writestr(zinfo,data)
+    zwriter.cnt += 1
+
+""" encode image as jpeg and add it to zip """
+def addZipImage(zwriter,name,img):
+    jpg_buffer = io.BytesIO()
+    img.save(jpg_buffer,format='JPEG')
+    addZipEntry(zwriter,name,jpg_buffer.getvalue())
+
+""" find central dir offset and size (and zip size) from the end of the zip,
+    only the tail is read, zip64 end records are followed when present """
+def findZipDir(zip_file):
+    with open(zip_file,"rb") as zfile:
+        zip_size = zfile.seek(0,2)
+        #end record sits in the last 22 bytes plus a comment of up to 64k
+        tail_size = min(zip_size,ZIP_END_SIZE + 0xffff)
+        zfile.seek(zip_size - tail_size)
+        tail = zfile.read(tail_size)
+
+        end_pos = tail.rfind(ZIP_END)
+        while end_pos >= 0:
+            comment_len = struct.unpack("<H",tail[end_pos + 20:end_pos + 22])[0]
+            if end_pos + ZIP_END_SIZE + comment_len == tail_size:
+                break
+            end_pos = tail.rfind(ZIP_END,0,end_pos) # signature was in the comment
+        if end_pos < 0:
+            raise zipfile.BadZipFile("no end of central directory in " + zip_file)
+
+        zip_entries, zip_dir_size, zip_offset = struct.unpack("<HLL",
+            tail[end_pos + 10:end_pos + 20])
+        if zip_entries == 0xffff or zip_dir_size == 0xffffffff or \
+            zip_offset == 0xffffffff:
+            loc_pos = zip_size - tail_size + end_pos - ZIP64_LOC_SIZE
+            zfile.seek(loc_pos)
+            zip64_loc = zfile.read(ZIP64_LOC_SIZE)
+            if zip64_loc[:4] == ZIP64_LOC:
+                zfile.seek(struct.unpack("<Q",zip64_loc[8:16])[0])
+                zip64_end = zfile.read(ZIP64_END_SIZE)
+                if zip64_end[:4] != ZIP64_END:
+                    raise zipfile.BadZipFile("bad zip64 end record in " + zip_file)
+                zip_dir_size, zip_offset = struct.unpack("<QQ",zip64_end[40:56])
+
+    return zip_offset, zip_dir_size, zip_size
+
+""" offset of entry data, from the local header since its extra field can
+    differ from the one in the central dir """
+def zipDataOffset(zfile,zinfo):
+    zfile.seek(zinfo.header_offset)
+    zip_header = zfile.read(30)
+    name_len, extra_len = struct.unpack("<HH",zip_header[26:30])
+    return zinfo.header_offset + 30 + name_len + extra_len
+
+""" close zip and note where its central dir is, from the writer rather than
+    reading the zip back: the dir starts at start_dir and only the end records,
+    a fixed size, follow it """
+def closeZipWriter(zwriter,ident,dir_loc,dir_file,dflag):
+    zwriter.zipf.close()
+    zip_offset = zwriter.zipf.start_dir
+    zip_size = os.path.getsize(zwriter.zip_file)
+    zip_dir_size = zip_size - zip_offset - ZIP_END_SIZE
+    #zipfile adds the zip64 end records when the count, offset or size need them
+    if zwriter.cnt > zipfile.ZIP_FILECOUNT_LIMIT or zip_offset > zipfile.ZIP64_LIMIT or \
+        zip_dir_size > zipfile.ZIP64_LIMIT:
+        zip_dir_size -= ZIP64_END_SIZE + ZIP64_LOC_SIZE
+
+    if dflag:
+        Path(dir_loc).mkdir(parents=True, exist_ok=True)
+        with open(zwriter.zip_file,"rb") as zfile:
+            zfile.seek(zip_offset,0)
+            zip_dir_data = zfile.read(zip_dir_size)
+        with open(dir_file,"wb") as f:
+            f.write(zip_dir_data) # write out zip dir
+
+    return zip_info(ident,zip_offset,zip_size,zwriter.ztype,zwriter.cnt)
+
+""" page zip in odw.zip for zip_dir, None if it is not there """
+def findCollZip(zip_dir,coll_zips):
+    fparts = zip_dir.fname.split('/')
+    fname = fparts[1]
+    for coll_zip in coll_zips:
+        if fname in coll_zip.fname:
+            if zip_dir.ztype == coll_zip.ztype:
+                return coll_zip
+
+    return None
+
+""" extract offsets base on ztype """
+def offsetColl(out_dir,zip_dir,coll_zips):
+    coll_zip = findCollZip(zip_dir,coll_zips)
+    if coll_zip is not None:
+        return coll_zip.offset, coll_zip.size
+
+    return 0, 0
+
+""" sorted, fixed width lookup for a page zip so a viewer can go from an entry
+    name to its bytes in odw.zip with one binary search: a header (ZIP_INDEX_HEADER)
+    then for each entry, in name order, its name NUL padded to the name width and
+    ZIP_INDEX_ENTRY, the data offset (already past coll_offset) and size """
+def writeZipIndex(index_file,page_zip,coll_offset):
+    entries = []
+    with zipfile.ZipFile(page_zip) as zipf, open(page_zip,"rb") as zfile:
+        for zinfo in zipf.infolist():
+            entries.append((zinfo.filename.encode(),
+                coll_offset + zipDataOffset(zfile,zinfo),zinfo.file_size))
+    name_width = max([len(name) for name, offset, size in entries] + [1])
+    entries.sort()
+
+    Path(index_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(index_file,"wb") as f:
+        f.write(struct.pack(ZIP_INDEX_HEADER,ZIP_INDEX,1,name_width,len(entries)))
+        for name, offset, size in entries:
+            f.write(name.ljust(name_width,b'\0') + struct.pack(ZIP_INDEX_ENTRY,offset,size))
+
+""" (offset, size) of name in odw.zip from a writeZipIndex file, None if it is not there """
+def findZipIndex(index_file,name):
+    with open(index_file,"rb") as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as index:
+        magic, version, name_width, cnt = struct.unpack_from(ZIP_INDEX_HEADER,index)
+        if magic != ZIP_INDEX:
+            return None
+        key = name.encode().ljust(name_width,b'\0')
+        if len(key) > name_width:
+            return None
+        header_size = struct.calcsize(ZIP_INDEX_HEADER)
+        entry_size = name_width + struct.calcsize(ZIP_INDEX_ENTRY)
+        low = 0
+        high = cnt
+        while low < high:
+            mid = (low + high) // 2
+            pos = header_size + mid * entry_size
+            if index[pos:pos + name_width] < key:
+                low = mid + 1
+            else:
+                high = mid
+        pos = header_size + low * entry_size
+        if low == cnt or index[pos:pos + name_width] != key:
+            return None
+        return struct.unpack_from(ZIP_INDEX_ENTRY,index,pos + name_width)
+
+""" record offsets for odw.json """
+def sortOutOffsets(out_dir,out_set,zip_dirs,json_zips,file_size,moffset,msize,
+    index_files=None,hits=None):
+    json_offsets = []
+    for zip_dir in zip_dirs:
+
+        coll_offset, coll_size = offsetColl(out_dir + '/' + out_set,zip_dir,json_zips)
+        json_offset = { "ident" : zip_dir.fname,
+            "coll_offset" : coll_offset,
+            "coll_size"   : coll_size,
+            "dir_offset"  : coll_offset + zip_dir.offset,
+            "dir_size"    : zip_dir.size - zip_dir.offset,
+            "ztype"       : zip_dir.ztype}
+        if index_files is not None and (zip_dir.fname,zip_dir.ztype) in index_files:
+            json_offset["index_file"] = index_files[(zip_dir.fname,zip_dir.ztype)]
+        json_offsets.append(json_offset)
+
+    json_obj = { "@id": out_set,
+                 "file_size" : file_size,
+                 "manifest_offset" : moffset,
+                 "manifest_size" : msize }
+    if hits is not None:
+        json_obj["hits_offset"], json_obj["hits_size"], json_obj["hits_head_size"] = hits
+    json_obj["zip_offsets"] = json_offsets
+    json_dump = json.dumps(json_obj, indent=4)
+
+    print("writing to", out_dir + "odw.json")
+    with open(out_dir + "odw.json", "w") as outfile:
+        outfile.write(json_dump)
+
+""" write out zip files """
+def createZipImages(zip_file,out_folder,img_wildcard):
+    with zipfile.ZipFile(zip_file, 'w') as imgs_zip:
+        for img in glob.glob(img_wildcard):
+            imgs_zip.write(img,img.replace(out_folder,''))
+    imgs_zip.close()
+
+""" pack an issue's page zips into odw.zip and record where everything sits in odw.json,
+    with index_folder each page zip also gets a writeZipIndex lookup there """
+def runThruZips(offset_folder,ia_folder,zip_dirs,index_folder=None):
+    zip_file = offset_folder + "odw.zip"
+    zipf = zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_STORED,
+        allowZip64=True, compresslevel=None)
+    zipdir(offset_folder[:-1], zipf, zip_file, offset_folder[:-1])
+
+    zipf.close()
+
+    coll_zips = []
+    moffset = 0
+    msize = 0
+    hits = None
+    with open(zip_file,"rb") as zfile:
+        for zinfo in sorted(zipf.infolist(), key=lambda zfile: zfile.filename):
+            # keep a copy of manifest in the zip archive
+            if 'manifest.json' in zinfo.filename:
+                moffset = zipDataOffset(zfile,zinfo)
+                msize = zinfo.file_size
+            # and the words by term from --hits, a viewer reads its head first
+            if zinfo.filename == 'hits.bin':
+                hoffset = zipDataOffset(zfile,zinfo)
+                hits = (hoffset,zinfo.file_size,readHitsHead(zfile,hoffset).size)
+            if '.zip' in zinfo.filename:
+                ztype = "blocks"
+                if "tiles.zip" in zinfo.filename:
+                    ztype = "tiles"
+                coll_zips.append(zip_info(zinfo.filename,
+                    zipDataOffset(zfile,zinfo),
+                    zinfo.file_size,ztype))
+
+    #bidx.bin and tidx.bin sit next to the bdir.bin and tdir.bin for the page
+    index_files = {}
+    if index_folder is not None:
+        for zip_dir in zip_dirs:
+            coll_zip = findCollZip(zip_dir,coll_zips)
+            if coll_zip is not None:
+                index_file = zip_dir.fname + "/" + zip_dir.ztype[0] + "idx.bin"
+                writeZipIndex(index_folder + index_file.split('/',1)[1],
+                    offset_folder + coll_zip.fname,coll_zip.offset)
+                index_files[(zip_dir.fname,zip_dir.ztype)] = index_file
+
+    sortOutOffsets(offset_folder,ia_folder,zip_dirs,coll_zips,
+         os.stat(zip_file).st_size,moffset,msize,index_files,hits)